@@ -21,7 +21,7 @@ class Agent:
             raise ValueError("Configuration must be provided")
         self.load_config(config)
         self.channel = None
-        self.query_manager = QueryManager()        
+        self.query_manager = QueryManager(matches_only=self.matches_only)
 
     def load_config(self, config):
         cfg_parser = ConfigParser()
@@ -30,6 +30,7 @@ class Agent:
         if agent_config is None:
             raise ValueError("Agent configuration not found in provided config file")
         self.heartbeat = agent_config.getint('heartbeat', 60)
+        self.matches_only = agent_config.getboolean('matches_only', False)
         host, port = agent_config.get('server', None).split(":")
         self.set_server_args(
             host=host,
@@ -89,7 +90,12 @@ class Agent:
         while True:
             try:
                 data = self.query_manager.run_all_queries()
-                self.channel.send(type="data", data=data)
+                matches, others = self.query_manager.split_matches(data)
+                if matches:
+                    self.logger.warning(f"IOC matches (set version {self.query_manager.ioc_version}): {json.dumps(matches)}")
+                    self.channel.send(type="data", data=matches)
+                if others or not matches:
+                    self.channel.send(type="data", data=others)
                 time.sleep(self.heartbeat)
             except Exception as e:
                 self.logger.error(f"Error in sender loop: {e}")
@@ -113,6 +119,9 @@ class Agent:
         if data["type"]=="upd":
             print(f"Update from server: {data['data']}")
             self.query_manager.update_queries(data["data"])
+        elif data["type"]=="ioc":
+            self.query_manager.update_iocs(data["data"])
+            self.logger.info(f"IOC set updated to version {data['data'].get('version')}")
         else:
             self.logger.warning(f"Unknown message type: {data['type']}")
             self.logger.warning(f"Message content: {data}")
@@ -1,4 +1,7 @@
+from bisect import bisect_left
+
 import subprocess
+import ipaddress
 import json
 
 class QueryManager:
@@ -7,9 +10,16 @@ class QueryManager:
     # Query Manager Configuration
     # ------------------------------------------------------------------
 
-    def __init__(self, osquery_path="osqueryi", queries={}):
+    _ADDRESS_COLUMNS = ("remote_address", "local_address", "address")
+
+    _HASH_COLUMNS = ("md5", "sha1", "sha256")
+
+    def __init__(self, osquery_path="osqueryi", queries={}, matches_only=False):
         self.queries = queries 
         self.osquery_path = osquery_path
+        self.matches_only = matches_only
+        self.iocs = {}
+        self.ioc_version = None
 
     # ------------------------------------------------------------------
     # Query Management
@@ -20,6 +30,56 @@ class QueryManager:
             raise ValueError("new_queries must be a dictionary")
         self.queries.update(new_queries)
 
+    def update_iocs(self, iocs):
+        if not isinstance(iocs, dict):
+            raise ValueError("iocs must be a dictionary")
+        self.iocs = {key: iocs.get(key, []) for key in ("ipv4", "ipv6") + QueryManager._HASH_COLUMNS}
+        self.ioc_version = iocs.get("version")
+
+    # ------------------------------------------------------------------
+    # IOC Matching
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def contains(values, value):
+        i = bisect_left(values, value)
+        return i < len(values) and values[i] == value
+
+    def match_row(self, row):
+        if not self.iocs or not isinstance(row, dict):
+            return False
+        for column in QueryManager._ADDRESS_COLUMNS:
+            value = row.get(column)
+            if not value:
+                continue
+            try:
+                address = ipaddress.ip_address(value)
+            except ValueError:
+                continue
+            if self.contains(self.iocs[f"ipv{address.version}"], int(address)):
+                return True
+        for column in QueryManager._HASH_COLUMNS:
+            value = row.get(column)
+            if value and self.contains(self.iocs[column], value.lower()):
+                return True
+        return False
+
+    def split_matches(self, results):
+        matches, others = {}, {}
+        for name, rows in results.items():
+            if not isinstance(rows, list):
+                others[name] = rows
+                continue
+            matched, rest = [], []
+            for row in rows:
+                (matched if self.match_row(row) else rest).append(row)
+            if matched:
+                matches[name] = matched
+            others[name] = rest
+        if self.matches_only:
+            others = {}
+        return matches, others
+
     # ------------------------------------------------------------------
     # Query Execution
     # ------------------------------------------------------------------
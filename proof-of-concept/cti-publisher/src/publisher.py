@@ -1,22 +1,27 @@
-from flask import Flask, jsonify
+from flask import Flask, jsonify, request
+from datetime import datetime, timezone
+from bisect import bisect_right
+from uuid import NAMESPACE_URL, uuid5
 
 import threading
 import json
 import time
 
-
 class Publisher:
     
     # ------------------------------------------------------------------
     # CTI Publisher Configuration
     # ------------------------------------------------------------------
 
+    _TAXII_MEDIA_TYPE = "application/taxii+json;version=2.1"
+
     def __init__(self, host="0.0.0.0", port=5000):
         self.app = Flask(__name__)
         self.host = host
         self.port = port
         self.collections = {}
         self.available_data = {}
+        self.date_added = {}
         self.start_time = time.time()
         self.setup_routes()
     
@@ -46,11 +51,65 @@ class Publisher:
             elapsed_minutes = int((time.time() - self.start_time) // 60)
             for collection_id in list(self.collections.keys()):
                 count = min(elapsed_minutes, len(self.collections[collection_id]))
-                if collection_id not in self.available_data:
-                    self.available_data[collection_id] = []
-                self.available_data[collection_id] = self.collections[collection_id][(count-1):count]
+                self.date_added[collection_id] = [int(self.start_time) + (i + 1) * 60 for i in range(count)]
+                self.available_data[collection_id] = self.collections[collection_id][:count]
             time.sleep(60)
 
+    def get_page(self, data, added, added_after=None, next=None, limit=None):
+        start = bisect_right(added, added_after) if added_after is not None else 0
+        if next is not None:
+            start = max(start, next)
+        end = len(data) if limit is None else min(start + limit, len(data))
+        return data[start:end], added[end - 1] if end > start else None, end
+
+    def get_taxii_objects(self, collection_id):
+        objects, added = [], []
+        for bundle, date_added in zip(self.available_data.get(collection_id, []), self.date_added.get(collection_id, [])):
+            for section in ("objects", "network_traffic", "relationships"):
+                for obj in bundle.get(section, []):
+                    objects.append(obj)
+                    added.append(date_added)
+        return objects, added
+
+    def get_taxii_collection(self, taxii_id):
+        for collection_id in self.available_data:
+            if self.taxii_id(collection_id) == taxii_id:
+                return collection_id
+        return None
+
+    @staticmethod
+    def taxii_id(collection_id):
+        return str(uuid5(NAMESPACE_URL, f"cti-publisher/collections/{collection_id}"))
+
+    def taxii_collection(self, collection_id):
+        return {
+            "id": self.taxii_id(collection_id),
+            "title": f"Collection {collection_id}",
+            "can_read": True,
+            "can_write": False,
+            "media_types": ["application/stix+json;version=2.1"]
+        }
+
+    def taxii_response(self, data, status=200):
+        response = jsonify(data)
+        response.status_code = status
+        response.headers['Content-Type'] = Publisher._TAXII_MEDIA_TYPE
+        return response
+
+    def parse_page_args(self):
+        added_after = self.parse_timestamp(request.args['added_after']) if 'added_after' in request.args else None
+        next = int(request.args['next']) if 'next' in request.args else None
+        limit = int(request.args['limit']) if 'limit' in request.args else None
+        return added_after, next, limit
+
+    @staticmethod
+    def format_timestamp(ts):
+        return datetime.fromtimestamp(ts, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+    @staticmethod
+    def parse_timestamp(value):
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
     # ------------------------------------------------------------------
     # Routes
     # ------------------------------------------------------------------
@@ -68,4 +127,70 @@ class Publisher:
 
         @self.app.route("/collections/<collection_id>", methods=["GET"])
         def get_collection(collection_id):
-            return jsonify(self.available_data.get(collection_id, []))
+            try:
+                added_after, next, limit = self.parse_page_args()
+            except ValueError:
+                return jsonify({"error": "Invalid added_after, next or limit parameter"}), 400
+            objects, last_added, end = self.get_page(self.available_data.get(collection_id, []), self.date_added.get(collection_id, []), added_after=added_after, next=next, limit=limit)
+            if added_after is None and next is None and limit is None:
+                response = jsonify(objects)
+            else:
+                more = end < len(self.available_data.get(collection_id, []))
+                envelope = {"more": more, "objects": objects}
+                if more:
+                    envelope["next"] = str(end)
+                response = jsonify(envelope)
+            if last_added is not None:
+                response.headers['X-TAXII-Date-Added-Last'] = self.format_timestamp(last_added)
+            response.add_etag()
+            return response.make_conditional(request)
+
+        @self.app.route("/taxii2/", methods=["GET"])
+        def taxii_discovery():
+            return self.taxii_response({
+                "title": "CTI Publisher",
+                "description": "TAXII 2.1 stand-in for the ICARUS proof of concept",
+                "default": "/api/",
+                "api_roots": ["/api/"]
+            })
+
+        @self.app.route("/api/", methods=["GET"])
+        def taxii_api_root():
+            return self.taxii_response({
+                "title": "CTI Publisher API Root",
+                "versions": [Publisher._TAXII_MEDIA_TYPE],
+                "max_content_length": 104857600
+            })
+
+        @self.app.route("/api/collections/", methods=["GET"])
+        def taxii_collections():
+            return self.taxii_response({"collections": [self.taxii_collection(cid) for cid in self.available_data]})
+
+        @self.app.route("/api/collections/<taxii_id>/", methods=["GET"])
+        def taxii_collection(taxii_id):
+            collection_id = self.get_taxii_collection(taxii_id)
+            if collection_id is None:
+                return self.taxii_response({"title": "Collection not found", "http_status": "404"}, status=404)
+            return self.taxii_response(self.taxii_collection(collection_id))
+
+        @self.app.route("/api/collections/<taxii_id>/objects/", methods=["GET"])
+        def taxii_objects(taxii_id):
+            collection_id = self.get_taxii_collection(taxii_id)
+            if collection_id is None:
+                return self.taxii_response({"title": "Collection not found", "http_status": "404"}, status=404)
+            try:
+                added_after, next, limit = self.parse_page_args()
+            except ValueError:
+                return self.taxii_response({"title": "Invalid added_after, next or limit parameter", "http_status": "400"}, status=400)
+            data, added = self.get_taxii_objects(collection_id)
+            objects, last_added, end = self.get_page(data, added, added_after=added_after, next=next, limit=limit)
+            envelope = {"more": end < len(data)}
+            if envelope["more"]:
+                envelope["next"] = str(end)
+            if objects:
+                envelope["objects"] = objects
+            response = self.taxii_response(envelope)
+            if last_added is not None:
+                response.headers['X-TAXII-Date-Added-First'] = self.format_timestamp(added[end - len(objects)])
+                response.headers['X-TAXII-Date-Added-Last'] = self.format_timestamp(last_added)
+            return response
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.feed_manager import FeedManager
+from src.cti_db import CTIDatabase
+from src.cti_utils import *
+
+from copy import deepcopy
+from uuid import UUID, uuid5
+
+import argparse
+import logging
+import time
+import json
+
+_DEFAULT_FEED = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "proof-of-concept", "data", "publisher", "cti.json")
+
+_BENCH_NAMESPACE = UUID("6f1c2d4e-8a3b-4c5d-9e7f-0a1b2c3d4e5f")
+
+# ------------------------------------------------------------------
+# Sample Feed
+# ------------------------------------------------------------------
+
+def scale_feed(bundles, copies):
+    scaled = []
+    for copy in range(copies):
+        ids = {}
+        for bundle in bundles:
+            for section in ("objects", "network_traffic", "relationships"):
+                for item in bundle.get(section, []):
+                    stix_type, _ = item['id'].split("--", 1)
+                    ids.setdefault(item['id'], f"{stix_type}--{uuid5(_BENCH_NAMESPACE, item['id'] + '/' + str(copy))}")
+        for bundle in bundles:
+            new_bundle = {"type": "bundle", "id": bundle['id']}
+            for section in ("objects", "network_traffic", "relationships"):
+                new_bundle[section] = [scale_item(item, copy, ids) for item in bundle.get(section, [])]
+            scaled.append(new_bundle)
+    return scaled
+
+def scale_item(item, copy, ids):
+    new_item = {}
+    for key, value in item.items():
+        if isinstance(value, str) and value in ids:
+            new_item[key] = ids[value]
+        elif key == "value" and item['type'] == "ipv4-addr":
+            new_item[key] = f"10.{(copy >> 8) & 255}.{copy & 255}.{value.rsplit('.', 1)[1]}"
+        elif key in ("value", "name"):
+            new_item[key] = f"{value}-{copy}"
+        else:
+            new_item[key] = value
+    return new_item
+
+# ------------------------------------------------------------------
+# Ingest Paths
+# ------------------------------------------------------------------
+
+def legacy_parse_feed_data(db, data, origin):
+    broker = db.get_broker()
+    id_map = {}
+    for item in data.get('objects', []) + data.get('network_traffic', []) + data.get('relationships', []):
+        dup = deepcopy(item)
+        risk = dup.pop('risk', None)
+        tlp = dup.pop('tlp', None)
+        exists, obj_id = broker.check_if_exists(dup)
+        if exists:
+            dup['id'] = obj_id
+            broker.update(dup, origin=origin, tlp=tlp, risk=risk)
+            id_map[item['id']] = obj_id
+            continue
+        for key, value in item.items():
+            if isinstance(value, str) and value in id_map:
+                item[key] = id_map[value]
+        dup = deepcopy(item)
+        risk = dup.pop('risk', None)
+        tlp = dup.pop('tlp', None)
+        if dup['type'] == 'relationship':
+            dup = create_relationship(dup['source_ref'], dup['target_ref'], dup['relationship_type'])
+        db.create(dup, origin=origin, tlp=tlp, risk=risk)
+
+def legacy(db, bundles):
+    for bundle in bundles:
+        legacy_parse_feed_data(db, bundle, "bench")
+
+def batched(db, bundles):
+    manager = FeedManager(db, logging.getLogger("bench"))
+    manager.parse_feed_page(bundles, "bench")
+
+# ------------------------------------------------------------------
+# Benchmark
+# ------------------------------------------------------------------
+
+def run(ingest, bundles, count):
+    db = CTIDatabase()
+    start = time.perf_counter()
+    ingest(db, deepcopy(bundles))
+    cold = count / (time.perf_counter() - start)
+    start = time.perf_counter()
+    ingest(db, deepcopy(bundles))
+    warm = count / (time.perf_counter() - start)
+    return cold, warm, len(db.get_broker().fingerprints)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark feed ingestion")
+    parser.add_argument('--feed', default=_DEFAULT_FEED, help='Feed JSON file to scale up (default: PoC cti.json)')
+    parser.add_argument('--copies', type=int, default=500, help='Number of renamed copies of the feed (default: 500)')
+    args = parser.parse_args()
+
+    with open(args.feed, "r") as f:
+        bundles = scale_feed(json.load(f), args.copies)
+    count = sum(len(bundle[section]) for bundle in bundles for section in ("objects", "network_traffic", "relationships"))
+
+    print(f"{count} feed objects in {len(bundles)} bundles")
+    print(f"{'path':<10}{'new objs/s':>15}{'known objs/s':>15}{'stored':>10}")
+    results = {}
+    for name, ingest in (("legacy", legacy), ("batched", batched)):
+        results[name] = run(ingest, bundles, count)
+        cold, warm, stored = results[name]
+        print(f"{name:<10}{cold:>15.0f}{warm:>15.0f}{stored:>10}")
+    print(f"{'speedup':<10}{results['batched'][0] / results['legacy'][0]:>14.1f}x{results['batched'][1] / results['legacy'][1]:>14.1f}x")
+
+if __name__ == "__main__":
+    main()
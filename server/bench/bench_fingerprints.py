@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hashlib import sha256
+
+import argparse
+import tracemalloc
+import time
+
+# ------------------------------------------------------------------
+# Fingerprint Maps
+# ------------------------------------------------------------------
+
+def make_keys(count, encode):
+    return [encode(sha256(f"object-{i}".encode()).digest()) for i in range(count)]
+
+def measure_map(count, encode):
+    tracemalloc.start()
+    fingerprints = {key: None for key in make_keys(count, encode)}
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return fingerprints, size
+
+def time_lookups(keys, check):
+    start = time.perf_counter()
+    for key in keys:
+        check(key)
+    return (time.perf_counter() - start) / len(keys) * 1e9
+
+# ------------------------------------------------------------------
+# Benchmark
+# ------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark fingerprint map memory and lookups")
+    parser.add_argument('--count', type=int, default=1000000, help='Number of fingerprints (default: 1000000)')
+    args = parser.parse_args()
+
+    scale = 1000000 / args.count
+    encodings = (
+        ("hex sha256", lambda digest: digest.hex()),
+        ("32-byte", lambda digest: digest),
+        ("16-byte", lambda digest: digest[:16]),
+    )
+    print(f"{'keys':<14}{'MB per 1M':>12}")
+    maps = {}
+    for name, encode in encodings:
+        maps[name], size = measure_map(args.count, encode)
+        print(f"{name:<14}{size * scale / 2**20:>12.1f}")
+
+    fingerprints = maps["16-byte"]
+    del maps
+    misses = [sha256(f"missing-{i}".encode()).digest()[:16] for i in range(min(args.count, 200000))]
+    print(f"negative lookup: dict {time_lookups(misses, fingerprints.__contains__):.0f} ns")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.cti_db import CTIDatabase
+from src.cti_utils import *
+
+from datetime import datetime
+
+import argparse
+import time
+
+# ------------------------------------------------------------------
+# Sample Rows
+# ------------------------------------------------------------------
+
+def make_process_rows(count):
+    return [{"pid": str(1000 + i), "name": f"proc{i}", "path": f"/usr/bin/proc{i}", "cmdline": f"proc{i} --flag {i}"} for i in range(count)]
+
+def make_file_rows(count):
+    return [{
+        "path": f"/tmp/file{i}", "size": str(i), "atime": str(1700000000 + i),
+        "ctime": str(1700000000 + i), "mtime": str(1700000000 + i),
+        "md5": f"{i:032x}", "sha1": f"{i:040x}", "sha256": f"{i:064x}"
+    } for i in range(count)]
+
+# ------------------------------------------------------------------
+# Ingest Paths
+# ------------------------------------------------------------------
+
+def stix_process(data):
+    return create_process(data['pid'], data['path'], data['cmdline'])
+
+def stix_file(data):
+    hashes = {"MD5": data['md5'], "SHA-1": data['sha1'], "SHA-256": data['sha256']}
+    ctime = datetime.fromtimestamp(int(data['ctime'])).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+    mtime = datetime.fromtimestamp(int(data['mtime'])).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+    atime = datetime.fromtimestamp(int(data['atime'])).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+    return create_file(data['path'], int(data['size']), ctime, mtime, atime, hashes)
+
+def record_process(data):
+    return create_process_record(data['pid'], data['path'], data['cmdline'])
+
+def record_file(data):
+    hashes = {"MD5": data['md5'], "SHA-1": data['sha1'], "SHA-256": data['sha256']}
+    ctime = format_timestamp(data['ctime'])
+    mtime = format_timestamp(data['mtime'])
+    atime = format_timestamp(data['atime'])
+    return create_file_record(data['path'], int(data['size']), ctime, mtime, atime, hashes)
+
+# ------------------------------------------------------------------
+# Benchmark
+# ------------------------------------------------------------------
+
+def run(build, rows, store):
+    db = CTIDatabase()
+    start = time.perf_counter()
+    for row in rows:
+        obj = build(row)
+        if store:
+            db.create(obj, origin="bench", tlp="red")
+    return len(rows) / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark agent row ingestion")
+    parser.add_argument('--rows', type=int, default=5000, help='Rows per result set (default: 5000)')
+    args = parser.parse_args()
+
+    cases = [
+        ("process", make_process_rows(args.rows), stix_process, record_process),
+        ("file", make_file_rows(args.rows), stix_file, record_file),
+    ]
+    print(f"{'type':<10}{'stage':<10}{'stix2 rows/s':>15}{'record rows/s':>15}{'speedup':>10}")
+    for name, rows, before, after in cases:
+        for stage, store in (("build", False), ("ingest", True)):
+            old = run(before, rows, store)
+            new = run(after, rows, store)
+            print(f"{name:<10}{stage:<10}{old:>15.0f}{new:>15.0f}{new / old:>9.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+from bisect import bisect_left, bisect_right, insort
+
+import ipaddress
+import threading
+
+class AddressIndex:
+
+    # ------------------------------------------------------------------
+    # Address Index Configuration
+    # ------------------------------------------------------------------
+
+    def __init__(self):
+        self.addresses = {4: {}, 6: {}}
+        self.sorted = {4: [], 6: []}
+        self.lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # CRUD Operations
+    # ------------------------------------------------------------------
+
+    def add(self, value, obj_id):
+        address = self.parse(value)
+        if address is None:
+            return False
+        key = int(address)
+        with self.lock:
+            index = self.addresses[address.version]
+            if key not in index:
+                insort(self.sorted[address.version], key)
+            index[key] = obj_id
+        return True
+
+    def remove(self, value):
+        address = self.parse(value)
+        if address is None:
+            return False
+        key = int(address)
+        with self.lock:
+            if self.addresses[address.version].pop(key, None) is None:
+                return False
+            keys = self.sorted[address.version]
+            del keys[bisect_left(keys, key)]
+        return True
+
+    # ------------------------------------------------------------------
+    # Query Functions
+    # ------------------------------------------------------------------
+
+    def lookup(self, value):
+        address = self.parse(value)
+        if address is None:
+            return None
+        return self.addresses[address.version].get(int(address))
+
+    def search(self, cidr):
+        network = ipaddress.ip_network(cidr, strict=False)
+        return self.range(network[0], network[-1])
+
+    def range(self, first, last):
+        first = ipaddress.ip_address(first)
+        last = ipaddress.ip_address(last)
+        if first.version != last.version:
+            raise ValueError("Range boundaries must share the same IP version")
+        version = first.version
+        with self.lock:
+            keys = self.sorted[version]
+            selected = keys[bisect_left(keys, int(first)):bisect_right(keys, int(last))]
+            index = self.addresses[version]
+            return [(str(ipaddress.ip_address(key)), index[key]) for key in selected]
+
+    def count(self):
+        return len(self.addresses[4]) + len(self.addresses[6])
+
+    # ------------------------------------------------------------------
+    # Utils
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def sort_key(value=None):
+        # Fixed width hex keeps numeric order while staying comparable with other string keys
+        if value is None:
+            return ""
+        return format(int(ipaddress.ip_address(value)), "032x")
+
+    @staticmethod
+    def parse(value):
+        try:
+            return ipaddress.ip_address(value)
+        except ValueError:
+            return None
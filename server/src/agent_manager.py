@@ -8,6 +8,7 @@ class AgentManager:
     
     def __init__(self):
         self.agents = {}
+        self.ips = {}
 
     # ------------------------------------------------------------------
     # CRUD Operations
@@ -26,6 +27,9 @@ class AgentManager:
             "external_ip": external_ip,
             "last_seen": None
         }
+        self.ips[internal_ip] = obj_id
+        if external_ip:
+            self.ips[external_ip] = obj_id
         return True
 
     def read(self, agent):
@@ -40,11 +44,17 @@ class AgentManager:
         agent = self.agents[agent]
         for key, value in updates.items():
             if key in agent:
+                if key in ("internal_ip", "external_ip"):
+                    self.ips.pop(agent[key], None)
+                    if value:
+                        self.ips[value] = agent["obj_id"]
                 agent[key] = value
         return agent
 
     def delete(self, agent):
         if agent in self.agents:
+            for key in ("internal_ip", "external_ip"):
+                self.ips.pop(self.agents[agent][key], None)
             del self.agents[agent]
             return True
         return False
@@ -57,10 +67,10 @@ class AgentManager:
         return obj_id in self.agents
 
     def get_by_ip(self, ip):
-        for agent in self.agents.values():
-            if agent["internal_ip"] == ip or agent["external_ip"] == ip:
-                return agent
-        return None
+        obj_id = self.ips.get(ip)
+        if obj_id is None:
+            return None
+        return self.agents.get(obj_id)
     
     def get_agent_list(self):
         agent_list = [x for x in self.agents.values()]
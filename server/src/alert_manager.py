@@ -1,10 +1,19 @@
+from src.alert_store import AlertStore
+from src.path_engine import PathEngine
+from src import alert_worker
+
 from collections import defaultdict
-from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from datetime import datetime, timedelta
+from hashlib import blake2b
 from uuid import uuid4
 
 import threading
 import time
 import json
+import os
 
 class AlertManager:
 
@@ -12,22 +21,41 @@ class AlertManager:
     # Alert Management Configuration
     # ------------------------------------------------------------------
 
-    def __init__(self, db, agents, qm, logger, threshold=40, depth_multiplier=3, depth_threshold=5, decay=1):
-        self.alerts = {
-            'active': [],
-            'resolved': [],
-            'dismissed': []
-        }
+    def __init__(self, db, agents, qm, logger, alert_file=None, threshold=40, depth_multiplier=3, depth_threshold=5, decay=1, max_path_length=8, max_paths=10, mode="incremental", path_ttl=None, workers=None, event_driven=False, sweep_interval=300, coalesce=0.05, group_window=600, group_by="object", group_prefix=2):
+        self.alerts = AlertStore(path=alert_file, logger=logger)
         self.paths = {}
+        self.path_ttl = path_ttl
+        self.evaluated = {}
+        self.graphs = {}
+        self.mode = mode
+        self.workers = workers
+        self.pool_size = workers or os.cpu_count() or 1
+        self.pool = None
+        self.timings = {"cycle": 0, "agents": {}}
+        self.propagated = False
+        self.paths_lock = threading.Lock()
+        self.event_driven = event_driven
+        self.sweep_interval = sweep_interval
+        self.coalesce = coalesce
+        self.pending_risks = {}
+        self.pending_edges = {}
+        self.pending_lock = threading.Lock()
+        self.pending_event = threading.Event()
+        self.group_window = group_window
+        self.group_by = group_by
+        self.group_prefix = group_prefix
+        self.group_lock = threading.Lock()
         self.threshold = threshold
         self.depth_multiplier = depth_multiplier
         self.depth_threshold = depth_threshold
         self.decay = decay
+        self.engine = PathEngine(depth_multiplier=depth_multiplier, max_length=max_path_length, max_paths=max_paths)
         self.db = db
         self.broker = db.get_broker()
         self.qm = qm
         self.logger = logger
         self.agents = agents
+        self.seed_paths()
 
     # ------------------------------------------------------------------
     # Alert Management State
@@ -37,67 +65,92 @@ class AlertManager:
         self.logger.info("Initializing AlertManager...")
         self.alert_thread = threading.Thread(target=self.alert_loop)
         self.alert_thread.start()
+        if self.event_driven:
+            events = self.db.get_events()
+            for event in ("object-created", "edge-created", "risk-raised"):
+                events.subscribe(event, self.on_event)
+            self.event_thread = threading.Thread(target=self.event_loop, daemon=True)
+            self.event_thread.start()
         self.logger.info("AlertManager started.")
 
     def stop(self):
         self.logger.info("Stopping AlertManager...")
+        if self.pool is not None:
+            self.pool.shutdown(wait=False)
         self.alert_thread.join()
+        self.alerts.close()
         self.logger.info("AlertManager stopped.")
 
     # ------------------------------------------------------------------
     # Main Loop
     # ------------------------------------------------------------------
 
-    def build_adjacency(self, nodes, edges):
-        adj = defaultdict(list)
-        for edge in edges:
-            src = edge["source"]
-            dst = edge["target"]
-            rel_id = edge["id"]
-            adj[src].append((rel_id, dst))
-        return adj
-
-
-    def find_all_paths(self, adj, start_id, end_id):
-        all_paths = []
-        def dfs(current, path, visited):
-            if current == end_id:
-                all_paths.append(path[:])
-                return
-
-            for rel_id, neighbor in adj.get(current, []):
-                if (rel_id, neighbor) not in visited:  
-                    visited.add((rel_id, neighbor))
-                    dfs(neighbor, path + [rel_id, neighbor], visited)
-                    visited.remove((rel_id, neighbor))
-        dfs(start_id, [start_id], set())
-        return all_paths
-
-    def make_path(self, start, end, data):
+    def make_path(self, start, end, data, adj=None, max_length=None):
         if not data:
             return []
-        adj = self.build_adjacency(data['nodes'], data['edges'])
-        paths = self.find_all_paths(adj, start, end)
-        return paths
+        if adj is None:
+            adj = self.engine.build_adjacency(data['edges'])
+        return self.engine.find_paths(adj, start, end, max_length=max_length)
 
     def check_alert_path(self, start, end, path_data):
         if not path_data:
             return False, True
-        new = True
-        same = False
-        path = [p for i, p in enumerate(path_data) if i % 2 == 0]
-        if start not in self.paths:
-            self.paths[start] = {}
-        if end not in self.paths[start]:
-            self.paths[start][end] = []
-        else:
-            new = False
-        if path in self.paths[start][end]:
-            same = True
-        else:
-            self.paths[start][end].append(path)
+        digest = self.hash_path(path_data)
+        with self.paths_lock:
+            known = self.paths.get((start, end))
+            new = known is None
+            if new:
+                known = self.paths[(start, end)] = {}
+            same = digest in known
+            known[digest] = time.time()
         return new, same
 
+    @staticmethod
+    def hash_path(path_data):
+        nodes = "\x1f".join(path_data[::2])
+        return blake2b(nodes.encode("utf-8"), digest_size=8).digest()
+
+    def seed_paths(self):
+        # Stored alerts already cover their paths, so a restart must not raise them again
+        now = time.time()
+        for alert in self.alerts.find():
+            self.paths.setdefault((alert['agent'], alert['object']), {})[self.hash_path(alert['path'])] = now
+
+    def expire_paths(self):
+        agents = set(self.agents.get_agents())
+        cutoff = time.time() - self.path_ttl if self.path_ttl else None
+        expired = 0
+        with self.paths_lock:
+            keys = list(self.paths)
+        # Risk lookups go to the broker first, the index is only locked to mutate it
+        dead = {key for key in keys if key[0] not in agents or self.broker.read(id=key[1]).get('risk', 0) <= 0}
+        with self.paths_lock:
+            for key in dead:
+                expired += len(self.paths.pop(key, ()))
+            if cutoff is None:
+                return expired
+            for key, known in list(self.paths.items()):
+                # Only a full evaluation that did not see a path again proves it is gone
+                evaluated = self.evaluated.get(key[0], 0)
+                stale = [digest for digest, seen in known.items() if seen < cutoff and seen < evaluated]
+                for digest in stale:
+                    del known[digest]
+                expired += len(stale)
+                if not known:
+                    del self.paths[key]
+        return expired
+
+    def get_metrics(self):
+        return {
+            "path_keys": len(self.paths),
+            "path_hashes": sum(len(known) for known in self.paths.values()),
+            "cached_graphs": len(self.graphs),
+            "active_alerts": self.alerts.count('active'),
+            "stored_graphs": len(self.alerts.graphs),
+            "cycle_seconds": round(self.timings["cycle"], 3),
+            "agent_seconds": {agent: round(t, 3) for agent, t in sorted(self.timings["agents"].items(), key=lambda item: -item[1])[:20]}
+        }
+
     def filter_graph_path(self, path, graph):
         simplified_graph = {
             'nodes': [],
@@ -111,44 +164,265 @@ class AlertManager:
                 simplified_graph['edges'].append(edge)
         return simplified_graph
 
-    def check_for_alerts(self, obj, agent, agent_graph):
-        paths = self.make_path(agent, obj['id'], agent_graph)
+    def report_path(self, agent, obj_id, risk, path, new_risk, graph=None):
+        new, same = self.check_alert_path(agent, obj_id, path)
+        if (new or not same) and new_risk > self.threshold:
+            self.logger.warning(f"{obj_id} has score {risk} above threshold {self.threshold}")
+            if graph is None:
+                graph = self.db.export_path_graph(path)
+            self.create(agent, obj_id, new, new_risk, path, graph)
+
+    def check_for_alerts(self, obj, agent, agent_graph, adj=None):
+        max_length = self.engine.max_useful_length(obj['risk'], self.threshold)
+        if max_length < 1:
+            return
+        paths = self.make_path(agent, obj['id'], agent_graph, adj=adj, max_length=max_length)
         for p in paths:
-            new, same = self.check_alert_path(agent, obj['id'], p)
-            new_risk = min((obj['risk']*self.depth_multiplier*2)/(len(p)-1),100)
-            new_risk = int(new_risk)
-            if (new or not same) and new_risk > self.threshold:
-                self.logger.warning(f"{obj['id']} has score {obj['risk']} above threshold {self.threshold}")
-                simple_graph = self.filter_graph_path(p, agent_graph)
-                self.create(agent, obj['id'], new, new_risk, p, simple_graph)
-        
-    def process_alerts_for_agent(self, agent):
-        agent_graph = self.db.export_object_graph(agent, search_depth=self.depth_threshold)
+            self.report_path(agent, obj['id'], obj['risk'], p, self.engine.score(obj['risk'], p), graph=self.filter_graph_path(p, agent_graph))
+
+    def evaluate_agent(self, agent, agent_graph):
         self.logger.info(f"Processing alerts for agent {agent}")
+        adj = self.engine.build_adjacency(agent_graph['edges'])
         for node in agent_graph['nodes']:
             obj = node['object']
             if obj['risk'] > 0:
-                self.check_for_alerts(obj, agent, agent_graph)
+                self.check_for_alerts(obj, agent, agent_graph, adj=adj)
+
+    def cache_graph(self, agent, agent_graph):
+        ids = {node['id'] for node in agent_graph['nodes']}
+        ids.update(edge['id'] for edge in agent_graph['edges'])
+        self.graphs[agent] = {'graph': agent_graph, 'ids': ids}
+
+    def refresh_graph(self, agent, touched):
+        agent_graph = self.graphs[agent]['graph']
+        for node in agent_graph['nodes']:
+            if node['id'] in touched:
+                obj = self.db.read(node['id'])
+                if obj:
+                    node['object'] = obj
+            else:
+                node['object']['risk'] = self.broker.read(id=node['id']).get('risk', 0)
+        return agent_graph
+
+    def process_alerts_for_agent(self, agent):
+        agent_graph = self.db.export_object_graph(agent, search_depth=self.depth_threshold)
+        self.cache_graph(agent, agent_graph)
+        self.evaluate_agent(agent, agent_graph)
+
+    def process_changed_agents(self):
+        changes = self.db.pop_changes()
+        agents = self.agents.get_agents()
+        timings = {}
+        for agent in agents:
+            start = time.perf_counter()
+            started = time.time()
+            cached = self.graphs.get(agent)
+            if cached is None:
+                self.process_alerts_for_agent(agent)
+            else:
+                touched = cached['ids'].intersection(changes)
+                if not touched:
+                    continue
+                if any(changes[obj_id] != "risk" for obj_id in touched):
+                    self.process_alerts_for_agent(agent)
+                else:
+                    self.evaluate_agent(agent, self.refresh_graph(agent, touched))
+            self.evaluated[agent] = started
+            timings[agent] = time.perf_counter() - start
+        for agent in set(self.graphs) - set(agents):
+            del self.graphs[agent]
+            self.evaluated.pop(agent, None)
+        self.timings["agents"] = timings
+        self.logger.info(f"Evaluated {len(timings)} of {len(agents)} agents after {len(changes)} changes")
+
+    def propagate_alerts(self):
+        changes = self.db.pop_changes()
+        if not changes and self.propagated:
+            return
+        started = time.time()
+        sources = self.broker.get_risky_objects()
+        agents = set(self.agents.get_agents())
+        results = self.engine.propagate(self.db.get_predecessors, sources, agents, self.threshold)
+        for (agent, obj_id), paths in sorted(results.items()):
+            for path in paths:
+                self.report_path(agent, obj_id, sources[obj_id], path, self.engine.score(sources[obj_id], path))
+        self.evaluated.update(dict.fromkeys(agents, started))
+        self.propagated = True
+        self.logger.info(f"Propagated {len(sources)} risky objects to {len(agents)} agents ({len(results)} reachable pairs)")
+
+    def process_agents_parallel(self):
+        changes = self.db.pop_changes()
+        if not changes and self.propagated:
+            return
+        started = time.time()
+        snapshot = self.db.snapshot()
+        agents = self.agents.get_agents()
+        timings = {}
+        # One batch per worker, so each cycle ships the snapshot once per process
+        batches = [agents[i::self.pool_size] for i in range(self.pool_size) if agents[i::self.pool_size]]
+        try:
+            futures = [self.get_pool().submit(alert_worker.evaluate_agents, batch, snapshot, self.engine, self.threshold) for batch in batches]
+            for future in futures:
+                for agent, results, elapsed in future.result():
+                    timings[agent] = elapsed
+                    for obj_id, risk, path, new_risk in results:
+                        self.report_path(agent, obj_id, risk, path, new_risk)
+                    self.evaluated[agent] = started
+        except BrokenProcessPool as e:
+            self.logger.error(f"Alert worker pool failed, restarting it next cycle: {e}")
+            self.pool = None
+            return
+        self.timings["agents"] = timings
+        self.propagated = True
+        if timings:
+            slowest = max(timings, key=timings.get)
+            self.logger.info(f"Evaluated {len(agents)} agents on snapshot {snapshot['version']} in parallel (slowest {slowest}: {timings[slowest]:.3f}s)")
+
+    def get_pool(self):
+        if self.pool is None:
+            # Workers are spawned once and reused, never forked from the threaded server
+            self.pool = ProcessPoolExecutor(max_workers=self.pool_size, mp_context=get_context("spawn"))
+        return self.pool
 
     def alert_loop(self):
+        last_sweep = None
         while True:
-            for agent in self.agents.get_agents():
-                self.process_alerts_for_agent(agent)
+            if not self.event_driven or last_sweep is None or time.time() - last_sweep >= self.sweep_interval:
+                last_sweep = time.time()
+                cycle_start = time.perf_counter()
+                if self.mode == "propagation":
+                    self.propagate_alerts()
+                elif self.mode == "parallel":
+                    self.process_agents_parallel()
+                else:
+                    self.process_changed_agents()
+                self.timings["cycle"] = time.perf_counter() - cycle_start
+                self.logger.info(f"Alert cycle finished in {self.timings['cycle']:.3f}s")
             self.broker.decay(self.decay)
+            expired = self.expire_paths()
+            self.logger.info(f"Alert path index: {json.dumps(self.get_metrics())} ({expired} expired)")
             risks = self.broker.access_risks()
             self.logger.info(f"Current mean risks by type: {json.dumps(risks)}")
             self.qm.update_rules(risks)
+            self.qm.update_agent_rules(self.get_agent_risks())
             time.sleep(30)
 
+    def get_agent_risks(self):
+        agent_risks = {}
+        for agent in self.agents.get_agents():
+            _, reached = self.engine.local_adjacency(self.db.get_successors, agent, self.depth_threshold)
+            reached.pop(agent, None)
+            agent_risks[agent] = self.broker.access_risks(reached)
+        return agent_risks
+
+    # ------------------------------------------------------------------
+    # Event Handling
+    # ------------------------------------------------------------------
+
+    def on_event(self, event, payload):
+        with self.pending_lock:
+            if event == "edge-created":
+                self.pending_edges[payload['id']] = (payload['source'], payload['target'])
+            elif payload.get('risk', 0) > 0:
+                self.pending_risks[payload['id']] = payload['risk']
+            else:
+                return
+        self.pending_event.set()
+
+    def event_loop(self):
+        while True:
+            self.pending_event.wait()
+            time.sleep(self.coalesce)
+            with self.pending_lock:
+                risks, edges = self.pending_risks, self.pending_edges
+                self.pending_risks, self.pending_edges = {}, {}
+                self.pending_event.clear()
+            try:
+                self.process_events(risks, edges)
+            except Exception as e:
+                self.logger.error(f"Error processing alert events: {e}")
+
+    def upstream_agents(self, obj_id, agents, max_length):
+        _, reached = self.engine.local_adjacency(self.db.get_predecessors, obj_id, max_length)
+        return [node for node in reached if node in agents]
+
+    def process_events(self, risks, edges):
+        start = time.perf_counter()
+        agents = set(self.agents.get_agents())
+        pairs = defaultdict(set)
+        for obj_id, risk in risks.items():
+            max_length = min(self.engine.max_useful_length(risk, self.threshold), self.engine.max_length)
+            if max_length < 1:
+                continue
+            for agent in self.upstream_agents(obj_id, agents, max_length):
+                pairs[agent].add(obj_id)
+        for source, target in edges.values():
+            upstream = self.upstream_agents(source, agents, self.engine.max_length - 1)
+            if not upstream:
+                continue
+            _, reached = self.engine.local_adjacency(self.db.get_successors, target, self.engine.max_length - 1)
+            risky = [obj_id for obj_id in reached if self.broker.read(id=obj_id).get('risk', 0) > 0]
+            for agent in upstream:
+                pairs[agent].update(risky)
+        for agent, targets in sorted(pairs.items()):
+            self.evaluate_targets(agent, targets)
+        if pairs:
+            self.logger.info(f"Evaluated {sum(len(t) for t in pairs.values())} agent-object pairs from {len(risks)} risk and {len(edges)} edge events in {time.perf_counter() - start:.3f}s")
+
+    def evaluate_targets(self, agent, targets):
+        limits = {}
+        for obj_id in targets:
+            risk = self.broker.read(id=obj_id).get('risk', 0)
+            max_length = min(self.engine.max_useful_length(risk, self.threshold), self.engine.max_length)
+            if obj_id != agent and max_length >= 1:
+                limits[obj_id] = (risk, max_length)
+        if not limits:
+            return
+        adj, reached = self.engine.local_adjacency(self.db.get_successors, agent, max(limit for _, limit in limits.values()))
+        for obj_id, (risk, max_length) in sorted(limits.items()):
+            if reached.get(obj_id, max_length + 1) > max_length:
+                continue
+            for path in self.engine.find_paths(adj, agent, obj_id, max_length=max_length):
+                self.report_path(agent, obj_id, risk, path, self.engine.score(risk, path))
+
     # ------------------------------------------------------------------
     # CRUD Operations
     # ------------------------------------------------------------------
 
+    def group_key(self, agent, node_id, data):
+        if self.group_by == "prefix":
+            return "\x1f".join(data[:2 * self.group_prefix + 1:2])
+        return f"{agent}\x1f{node_id}"
+
+    def correlate(self, group):
+        if not self.group_window:
+            return None
+        cutoff = datetime.now() - timedelta(seconds=self.group_window)
+        for alert in self.alerts.find_group(group, status='active'):
+            if datetime.fromisoformat(alert.get('last_seen', alert['timestamp'])) >= cutoff:
+                return alert
+        return None
+
     def create(self, agent, node_id, new, risk, data, graph):
+        group = self.group_key(agent, node_id, data)
+        with self.group_lock:
+            existing = self.correlate(group)
+            if existing is None:
+                return self._create(agent, node_id, new, risk, data, graph, group)
+            self.alerts.update(existing['id'], {
+                "risk": max(existing['risk'], risk),
+                "path_count": existing.get('path_count', 1) + 1,
+                "last_seen": datetime.now().isoformat()
+            })
+        self.logger.warning(f"Grouped attack path from {node_id} to agent {agent} into alert {existing['id']}:\n{data}")
+        return existing['id']
+
+    def _create(self, agent, node_id, new, risk, data, graph, group):
         if new:
             self.logger.warning(f"Creating new alert from {node_id} targeting agent {agent}:\n{data}")
         else:
             self.logger.warning(f"Creating new attack path from {node_id} to agent {agent}:\n{data}")
+        timestamp = datetime.now().isoformat()
         alert = {
             "id": f"alert--{uuid4()}",
             "type": "alert",
@@ -156,53 +430,67 @@ class AlertManager:
             "object": node_id,
             "risk": risk,
             "path": data,
-            "graph": graph,
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": timestamp,
+            "last_seen": timestamp,
+            "group": group,
+            "path_count": 1,
+            "status": "active",
             "resolved": False,
             "dismissed": False
         }
-        self.alerts['active'].append(alert)
+        return self.alerts.add(alert, graph)
 
     def read(self, id, status='active'):
-        for alert in self.alerts[status]:
-            if alert['id'] == id:
-                return alert
-        return None
-        
+        alert = self.alerts.get(id)
+        if alert is None or alert['status'] != status:
+            return None
+        return alert
 
     def update(self, id, updates, status='active'):
-        for alert in self.alerts[status]:
-            if alert['id'] == id:
-                alert.update(updates)
-                return True
-        return False
+        alert = self.alerts.get(id, with_graph=False)
+        if alert is None or alert['status'] != status:
+            return False
+        return self.alerts.update(id, updates)
 
     def delete(self, id, status='active'):
-        for i, alert in enumerate(self.alerts[status]):
-            if alert['id'] == id:
-                del self.alerts[status][i]
-                return True
-        return False
+        alert = self.alerts.get(id, with_graph=False)
+        if alert is None or alert['status'] != status:
+            return False
+        return self.alerts.delete(id)
+
+    def resolve(self, id):
+        return self.alerts.set_status(id, "resolved")
+
+    def dismiss(self, id):
+        return self.alerts.set_status(id, "dismissed")
+
+    def reopen(self, id):
+        return self.alerts.set_status(id, "active")
 
     # ------------------------------------------------------------------
     # Query Operations
     # ------------------------------------------------------------------
 
-    def get_active_alerts(self):
-        return self.alerts['active']
+    def get_alerts(self, status, offset=0, limit=None):
+        return self.alerts.list(status, offset=offset, limit=limit)
 
-    def get_resolved_alerts(self):
-        return self.alerts['resolved']
+    def get_active_alerts(self, offset=0, limit=None):
+        return self.alerts.list('active', offset=offset, limit=limit)
 
-    def get_dismissed_alerts(self):
-        return self.alerts['dismissed']
+    def get_resolved_alerts(self, offset=0, limit=None):
+        return self.alerts.list('resolved', offset=offset, limit=limit)
+
+    def get_dismissed_alerts(self, offset=0, limit=None):
+        return self.alerts.list('dismissed', offset=offset, limit=limit)
 
     def get_all_alerts(self):
-        return self.alerts
+        return self.alerts.export()
 
     def get_alert_by_id(self, alert_id):
-        for status, alerts in self.alerts.items():
-            for alert in alerts:
-                if alert['id'] == alert_id:
-                    return alert
-        return None
\ No newline at end of file
+        return self.alerts.get(alert_id)
+
+    def find_alerts(self, agent=None, obj_id=None, status=None):
+        return self.alerts.find(agent=agent, obj_id=obj_id, status=status)
+
+    def count_alerts(self, status=None):
+        return self.alerts.count(status)
@@ -0,0 +1,222 @@
+from collections import defaultdict
+from hashlib import blake2b
+
+import threading
+import heapq
+import json
+import os
+
+class AlertStore:
+
+    # ------------------------------------------------------------------
+    # Alert Store Configuration
+    # ------------------------------------------------------------------
+
+    _STATUSES = ("active", "resolved", "dismissed")
+
+    def __init__(self, path=None, logger=None):
+        self.alerts = {}
+        self.by_status = {status: {} for status in AlertStore._STATUSES}
+        self.by_agent = defaultdict(dict)
+        self.by_object = defaultdict(dict)
+        self.by_group = defaultdict(dict)
+        self.graphs = {}
+        self.graph_refs = defaultdict(int)
+        self.lock = threading.RLock()
+        self.logger = logger
+        self.path = path
+        self.journal = None
+        if path:
+            self.load()
+
+    # ------------------------------------------------------------------
+    # CRUD Operations
+    # ------------------------------------------------------------------
+
+    def add(self, alert, graph):
+        with self.lock:
+            self._add(alert, graph)
+            self._write({"op": "add", "alert": alert, "graph": graph})
+        return alert['id']
+
+    def get(self, alert_id, with_graph=True):
+        alert = self.alerts.get(alert_id)
+        if alert is None or not with_graph:
+            return alert
+        return dict(alert, graph=self.graphs.get(alert['graph_ref'], {"nodes": [], "edges": []}))
+
+    def update(self, alert_id, updates):
+        with self.lock:
+            if alert_id not in self.alerts:
+                return False
+            updates = {k: v for k, v in updates.items() if k not in ("id", "status", "graph_ref", "group")}
+            self.alerts[alert_id].update(updates)
+            self._write({"op": "update", "id": alert_id, "updates": updates})
+        return True
+
+    def delete(self, alert_id):
+        with self.lock:
+            if not self._delete(alert_id):
+                return False
+            self._write({"op": "delete", "id": alert_id})
+        return True
+
+    def set_status(self, alert_id, status):
+        if status not in self.by_status:
+            raise ValueError(f"Unknown alert status: {status}")
+        with self.lock:
+            if not self._set_status(alert_id, status):
+                return False
+            self._write({"op": "status", "id": alert_id, "status": status})
+        return True
+
+    # ------------------------------------------------------------------
+    # Query Functions
+    # ------------------------------------------------------------------
+
+    def list(self, status, offset=0, limit=None, newest_first=True):
+        with self.lock:
+            # Status indexes keep insertion order, so status changes are O(1) and pages are ordered by timestamp here
+            entries = ((self.alerts[alert_id]['timestamp'], i, alert_id) for i, alert_id in enumerate(self.by_status.get(status, {})))
+            if limit is None:
+                ordered = sorted(entries, reverse=newest_first)
+            else:
+                ordered = (heapq.nlargest if newest_first else heapq.nsmallest)(offset + limit, entries)
+            return [self.alerts[alert_id] for _, _, alert_id in ordered[offset:]]
+
+    def find(self, agent=None, obj_id=None, status=None, group=None):
+        with self.lock:
+            candidates = [
+                set(index) for index in (
+                    self.by_agent.get(agent, {}) if agent else None,
+                    self.by_object.get(obj_id, {}) if obj_id else None,
+                    self.by_status.get(status, {}) if status else None,
+                    self.by_group.get(group, {}) if group else None
+                ) if index is not None
+            ]
+            if not candidates:
+                return list(self.alerts.values())
+            ids = set.intersection(*candidates)
+            return sorted((self.alerts[alert_id] for alert_id in ids), key=lambda alert: alert['timestamp'])
+
+    def find_group(self, group, status=None):
+        with self.lock:
+            ids = self.by_group.get(group, {})
+            return [self.alerts[alert_id] for alert_id in reversed(ids) if status is None or self.alerts[alert_id]['status'] == status]
+
+    def count(self, status=None):
+        if status is None:
+            return len(self.alerts)
+        return len(self.by_status.get(status, {}))
+
+    def export(self):
+        return {status: self.list(status, newest_first=False) for status in AlertStore._STATUSES}
+
+    # ------------------------------------------------------------------
+    # Internal State
+    # ------------------------------------------------------------------
+
+    def _add(self, alert, graph):
+        ref = alert.get('graph_ref') or self.graph_key(alert['path'])
+        alert['graph_ref'] = ref
+        alert.setdefault('status', 'active')
+        if ref not in self.graphs:
+            self.graphs[ref] = graph
+        self.graph_refs[ref] += 1
+        self.alerts[alert['id']] = alert
+        self.by_status[alert['status']][alert['id']] = None
+        self.by_agent[alert['agent']][alert['id']] = None
+        self.by_object[alert['object']][alert['id']] = None
+        if alert.get('group'):
+            self.by_group[alert['group']][alert['id']] = None
+
+    def _delete(self, alert_id):
+        alert = self.alerts.pop(alert_id, None)
+        if alert is None:
+            return False
+        self.by_status[alert['status']].pop(alert_id, None)
+        self._drop(self.by_agent, alert['agent'], alert_id)
+        self._drop(self.by_object, alert['object'], alert_id)
+        if alert.get('group'):
+            self._drop(self.by_group, alert['group'], alert_id)
+        ref = alert['graph_ref']
+        self.graph_refs[ref] -= 1
+        if self.graph_refs[ref] <= 0:
+            self.graph_refs.pop(ref, None)
+            self.graphs.pop(ref, None)
+        return True
+
+    def _set_status(self, alert_id, status):
+        alert = self.alerts.get(alert_id)
+        if alert is None:
+            return False
+        self.by_status[alert['status']].pop(alert_id, None)
+        self.by_status[status][alert_id] = None
+        alert['status'] = status
+        alert['resolved'] = status == "resolved"
+        alert['dismissed'] = status == "dismissed"
+        return True
+
+    @staticmethod
+    def _drop(index, key, alert_id):
+        ids = index.get(key)
+        if ids is not None:
+            ids.pop(alert_id, None)
+            if not ids:
+                del index[key]
+
+    @staticmethod
+    def graph_key(path):
+        return blake2b("\x1f".join(path).encode("utf-8"), digest_size=12).hexdigest()
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def load(self):
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        self._replay(json.loads(line))
+                    except (ValueError, KeyError) as e:
+                        if self.logger:
+                            self.logger.error(f"Skipping invalid alert journal entry: {e}")
+            self.compact()
+        self.journal = open(self.path, "a")
+
+    def _replay(self, entry):
+        op = entry['op']
+        if op == "add":
+            self._add(entry['alert'], entry['graph'])
+        elif op == "update" and entry['id'] in self.alerts:
+            self.alerts[entry['id']].update(entry['updates'])
+        elif op == "status":
+            self._set_status(entry['id'], entry['status'])
+        elif op == "delete":
+            self._delete(entry['id'])
+
+    def compact(self):
+        with self.lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                for alert in self.alerts.values():
+                    f.write(json.dumps({"op": "add", "alert": alert, "graph": self.graphs[alert['graph_ref']]}) + "\n")
+            os.replace(tmp_path, self.path)
+            if self.journal:
+                self.journal.close()
+                self.journal = open(self.path, "a")
+
+    def _write(self, entry):
+        if self.journal is None:
+            return
+        self.journal.write(json.dumps(entry) + "\n")
+        self.journal.flush()
+
+    def close(self):
+        with self.lock:
+            if self.journal:
+                self.journal.close()
+                self.journal = None
@@ -0,0 +1,28 @@
+import time
+
+# ------------------------------------------------------------------
+# Alert Worker
+# Note: Module level functions so they can be pickled by the process
+# pool used by AlertManager in parallel mode. The snapshot travels
+# with each batch, since the pool outlives any one snapshot.
+# ------------------------------------------------------------------
+
+def evaluate_agents(agents, snapshot, engine, threshold):
+    return [evaluate_agent(agent, snapshot, engine, threshold) for agent in agents]
+
+def evaluate_agent(agent, snapshot, engine, threshold):
+    start = time.perf_counter()
+    risks = snapshot['risks']
+    snapshot_adjacency = snapshot['adjacency']
+    adjacency, reached = engine.local_adjacency(lambda node: snapshot_adjacency.get(node, ()), agent, engine.max_length)
+    results = []
+    for obj_id in sorted(reached):
+        risk = risks.get(obj_id, 0)
+        if risk <= 0 or obj_id == agent:
+            continue
+        max_length = engine.max_useful_length(risk, threshold)
+        if max_length < reached[obj_id]:
+            continue
+        for path in engine.find_paths(adjacency, agent, obj_id, max_length=max_length):
+            results.append((obj_id, risk, path, engine.score(risk, path)))
+    return agent, results, time.perf_counter() - start
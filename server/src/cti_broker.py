@@ -17,11 +17,16 @@ class CTIBroker:
         "revoked", "spec_version",
         "tlp", "risk",
         "origin", "history",
-        "mtime","ctime","atime"
+        "updated",
+        "mtime","ctime","atime",
+        "first_seen", "last_seen",
+        "number_observed"
     }
 
     _TLP_LEVELS = {"white": 0, "green": 1, "amber": 2, "red": 3}
 
+    _DIGEST_SIZE = 16
+
     def __init__(self, cti_db):
         self.cti_db = cti_db
         self.fingerprints = {}
@@ -31,8 +36,8 @@ class CTIBroker:
     # CRUD Operations
     # ------------------------------------------------------------------ 
 
-    def create(self,obj,origin=None,tlp=None,risk=None):
-        fp = self._fingerprint(obj)
+    def create(self,obj,origin=None,tlp=None,risk=None,fp=None):
+        fp = fp or self._fingerprint(obj)
         if fp in self.fingerprints:
             return False
         if tlp is None:
@@ -49,6 +54,7 @@ class CTIBroker:
             'risk': risk,
             'origin': origin,
             'history': [f'''{timestamp}: Created by {origin} [{tlp}, {risk}]'''],
+            'updated': timestamp,
         }
         self.ids_to_fps[obj['id']] = fp
         return True
@@ -60,9 +66,9 @@ class CTIBroker:
             fp = self.ids_to_fps.get(id)
         return self.fingerprints[fp] if fp in self.fingerprints else {}
     
-    def update(self, obj, origin=None, tlp=None, risk=None):
+    def update(self, obj, origin=None, tlp=None, risk=None, fp=None):
         existing_fp = self.ids_to_fps.get(obj['id'])
-        fp = self._fingerprint(obj)
+        fp = fp or self._fingerprint(obj)
         timestamp = datetime.now().isoformat()
         updated_obj = False
         if fp != existing_fp:
@@ -79,6 +85,10 @@ class CTIBroker:
         updated_risk = self.set_risk(fp, risk)
         if updated_risk:
             self.fingerprints[fp]['history'].append(f'''{timestamp}: Risk updated by {origin} to {risk}''')
+        if updated_obj or updated_tlp or updated_risk:
+            self.fingerprints[fp]['updated'] = timestamp
+        if updated_tlp:
+            self.cti_db.notify_changed([obj['id']])
         return updated_obj or updated_tlp or updated_risk
 
     def delete(self, obj_id):
@@ -100,6 +110,7 @@ class CTIBroker:
         if CTIBroker._TLP_LEVELS[tlp] <= CTIBroker._TLP_LEVELS[self.fingerprints[fp]['tlp']]:
             return False
         self.fingerprints[fp]['tlp'] = tlp
+        return True
 
     def set_risk(self, fp, risk):
         if fp not in self.fingerprints or risk is None:
@@ -107,12 +118,30 @@ class CTIBroker:
         if risk <= self.fingerprints[fp]['risk']:
             return False
         self.fingerprints[fp]['risk'] = risk
+        self.cti_db.mark_changed([self.fingerprints[fp]['id']], "risk")
+        self.cti_db.events.publish("risk-raised", {"id": self.fingerprints[fp]['id'], "risk": risk})
+        return True
+
+    def set_observed(self, obj_id, timestamp):
+        fp = self.ids_to_fps.get(obj_id)
+        if fp not in self.fingerprints:
+            return False
+        data = self.fingerprints[fp]
+        previous = {field: data[field] for field in ('last_seen', 'number_observed') if field in data}
+        seen = datetime.fromtimestamp(timestamp).isoformat()
+        data.setdefault('first_seen', seen)
+        data['last_seen'] = seen
+        data['number_observed'] = data.get('number_observed', 0) + 1
+        data['updated'] = seen
+        self.cti_db.reindex(obj_id, previous)
+        self.cti_db.notify_changed([obj_id])
         return True
 
     def set_history(self, obj_id, message):
         fp = self.ids_to_fps[obj_id]
         if fp:
             self.fingerprints[fp]['history'].append(message)
+            self.cti_db.notify_changed([obj_id])
             return True
         return False
 
@@ -120,8 +149,8 @@ class CTIBroker:
     # Query Functions
     # ------------------------------------------------------------------
 
-    def check_if_exists(self, obj):
-        fp = self._fingerprint(obj)
+    def check_if_exists(self, obj, fp=None):
+        fp = fp or self._fingerprint(obj)
         if fp in self.fingerprints:
             return True, self.fingerprints[fp]['id']
         return False, None
@@ -130,6 +159,9 @@ class CTIBroker:
     # Advanced Functions
     # ------------------------------------------------------------------
 
+    def fingerprint(self, obj):
+        return self._fingerprint(obj)
+
     @staticmethod
     def _fingerprint(stix_obj):
         if not isinstance(stix_obj, dict):
@@ -137,7 +169,13 @@ class CTIBroker:
         obj_copy = {k: v for k, v in stix_obj.items()
                     if k not in CTIBroker._META_FIELDS}
         canonical = json.dumps(obj_copy, sort_keys=True, separators=(",", ":"))
-        return sha256(canonical.encode("utf-8")).hexdigest()
+        return sha256(canonical.encode("utf-8")).digest()[:CTIBroker._DIGEST_SIZE]
+
+    def get_memory_stats(self):
+        return {
+            "fingerprints": len(self.fingerprints),
+            "digest_bytes": CTIBroker._DIGEST_SIZE
+        }
 
     def decay(self, decay_factor):
         for fp, data in self.fingerprints.items():
@@ -146,9 +184,13 @@ class CTIBroker:
                 if data['risk'] % 10 == 0:
                     data['history'].append(f'''{datetime.now().isoformat()}: Risk decayed to {data['risk']}''')
 
-    def access_risks(self):
+    def get_risky_objects(self):
+        return {data['id']: data['risk'] for data in list(self.fingerprints.values()) if data['risk'] > 0}
+
+    def access_risks(self, ids=None):
         type_risks = defaultdict(list)
-        for data in self.fingerprints.values():
-            if data['risk'] > 0:
+        records = self.fingerprints.values() if ids is None else (self.read(id=obj_id) for obj_id in ids)
+        for data in records:
+            if data and data['risk'] > 0:
                 type_risks[data['type']].append(data['risk'])
         return {t: sum(risks) / len(risks) for t, risks in type_risks.items()}
\ No newline at end of file
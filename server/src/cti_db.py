@@ -1,7 +1,18 @@
+from src.address_index import AddressIndex
+from src.event_bus import EventBus
+from src.record_source import RecordSource
+from src.search_index import SearchIndex
+from src.type_index import TypeIndex
 from src.cti_broker import CTIBroker
+from src.cti_utils import Record, to_stix
 
 from stix2 import MemoryStore, CompositeDataSource, Filter
-from typing import Dict, List, Optional, Union
+from stix2.exceptions import STIXError
+from typing import Dict, Iterator, List, Optional, Union
+from collections import defaultdict
+from itertools import count
+from contextlib import contextmanager
+from datetime import datetime
 from uuid import uuid4
 
 try:
@@ -9,6 +20,9 @@ try:
 except ImportError:
     STIXObject = object 
 
+import threading
+import base64
+import heapq
 import json
 
 class CTIDatabase:
@@ -17,49 +31,204 @@ class CTIDatabase:
     # CTI DB Configuration
     # ------------------------------------------------------------------
     
+    _CHANGE_PRIORITY = {"risk": 0, "object": 1, "edge": 2}
+
     def __init__(self):
+        self.version = 0
+        self.changes = {}
+        self.changes_lock = threading.Lock()
+        self.deferred = threading.local()
+        self.lock = threading.RLock()
+        self.events = EventBus()
         self.mem_store = MemoryStore()
+        self.records = RecordSource()
+        self.addresses = AddressIndex()
+        self.search_index = SearchIndex()
+        self.type_index = TypeIndex()
+        self.edges_out = defaultdict(dict)
+        self.edges_in = defaultdict(dict)
+        self.exportable = {}
         self._composite = CompositeDataSource()
-        self._composite.add_data_source(self.mem_store.source)
+        self._composite.add_data_sources([self.mem_store.source, self.records])
         self.broker = CTIBroker(self)
 
     # ------------------------------------------------------------------
     # CRUD Operations
     # ------------------------------------------------------------------
 
-    def create(self, obj, origin=None, tlp=None, risk=None):
-        exists,obj_id = self.broker.check_if_exists(obj)
-        if exists:
-            obj = self.read(obj_id)
-            self.broker.update(obj, origin=origin, tlp=tlp, risk=risk)
-            return False, obj_id
-        self.mem_store.add(obj)
-        self.broker.create(obj, origin=origin, tlp=tlp, risk=risk)
-        return True, obj['id']
+    def create(self, obj, origin=None, tlp=None, risk=None, fp=None):
+        with self.lock:
+            fp = fp or self.broker.fingerprint(obj)
+            exists,obj_id = self.broker.check_if_exists(obj, fp=fp)
+            if exists:
+                self.broker.update({'id': obj_id}, origin=origin, tlp=tlp, risk=risk, fp=fp)
+                return False, obj_id
+            if isinstance(obj, Record):
+                self.records.add(obj)
+            else:
+                self.mem_store.add(obj)
+            self.broker.create(obj, origin=origin, tlp=tlp, risk=risk, fp=fp)
+            self._index(obj)
+            self.mark_changed([obj['id']], "object")
+            refs = self.get_edge_refs(obj)
+            if refs:
+                self.mark_changed([obj['id'], *refs], "edge")
+            self.events.publish("object-created", {"id": obj['id'], "type": obj['type'], "risk": self.broker.read(id=obj['id']).get('risk', 0)})
+            if refs and len(refs) == 2:
+                self.events.publish("edge-created", {"id": obj['id'], "source": refs[0], "target": refs[1]})
+            return True, obj['id']
+
+    def create_batch(self, entries, origin=None):
+        with self.lock:
+            return [self.create(obj, origin=origin, tlp=tlp, risk=risk, fp=fp) for obj, tlp, risk, fp in entries]
 
     def read(self, obj_id):
         obj = self._composite.get(obj_id)
-        if not isinstance(obj, dict):
+        if obj is None:
+            return None
+        if isinstance(obj, dict):
+            obj = dict(obj)
+        else:
             obj = json.loads(obj.serialize())
         extra = self.broker.read(id=obj_id)
         obj.update(extra)
         return obj
 
     def update(self, obj_id, updates):
-        existing = self._composite.get(obj_id)
-        if not existing:
-            return None
-        new_obj = existing.new_version(**updates)
-        if not self.broker.update(new_obj):
-            return None
-        self.mem_store.add(new_obj)
-        return new_obj
+        with self.lock:
+            existing = self._composite.get(obj_id)
+            if not existing:
+                return None
+            if isinstance(existing, Record):
+                new_obj = Record(existing, **updates)
+            else:
+                new_obj = existing.new_version(**updates)
+            indexed = self._observed(existing)
+            if not self.broker.update(new_obj):
+                return None
+            if isinstance(new_obj, Record):
+                self.records.add(new_obj)
+            else:
+                self.mem_store.add(new_obj)
+            self._unindex(indexed)
+            self._index(new_obj)
+            refs = self.get_edge_refs(new_obj)
+            if refs:
+                self.mark_changed([obj_id, *refs, *self.get_edge_refs(existing)], "edge")
+            else:
+                self.mark_changed([obj_id], "object")
+            return new_obj
+
+    def reindex(self, obj_id, previous):
+        # Observation counters live in the broker but are also sort keys, so their entries move with them
+        with self.lock:
+            existing = self._composite.get(obj_id)
+            if not existing:
+                return False
+            return self.type_index.move(dict(existing, **previous), self._observed(existing))
 
     def delete(self, obj_id):
-        if not self.broker.delete(obj_id):
-            return False
-        self.mem_store.source.delete(obj_id)
-        return True
+        with self.lock:
+            existing = self._composite.get(obj_id)
+            indexed = self._observed(existing) if existing is not None else None
+            if not self.broker.delete(obj_id):
+                return False
+            if not self.records.delete(obj_id):
+                self.mem_store.source._data.pop(obj_id, None)
+            if existing is not None:
+                self._unindex(indexed)
+                self.mark_changed([obj_id, *(self.get_edge_refs(existing) or ())], "edge")
+            return True
+
+    # ------------------------------------------------------------------
+    # Change Tracking
+    # ------------------------------------------------------------------
+
+    def mark_changed(self, obj_ids, kind):
+        priority = CTIDatabase._CHANGE_PRIORITY
+        with self.changes_lock:
+            self.version += 1
+            for obj_id in obj_ids:
+                current = self.changes.get(obj_id)
+                if current is None or priority[kind] > priority[current]:
+                    self.changes[obj_id] = kind
+        self.notify_changed(obj_ids)
+
+    def notify_changed(self, obj_ids):
+        pending = getattr(self.deferred, "ids", None)
+        if pending is not None:
+            pending.update(obj_ids)
+            return
+        if self.events.has_subscribers("objects-changed"):
+            self.events.publish("objects-changed", {"ids": list(obj_ids), "version": self.version})
+
+    @contextmanager
+    def batch_changes(self):
+        # Collects this thread's change notifications and publishes them once on exit
+        if getattr(self.deferred, "ids", None) is not None:
+            yield
+            return
+        self.deferred.ids = set()
+        try:
+            yield
+        finally:
+            ids, self.deferred.ids = self.deferred.ids, None
+            if ids:
+                self.notify_changed(ids)
+
+    def pop_changes(self):
+        with self.changes_lock:
+            changes = self.changes
+            self.changes = {}
+        return changes
+
+    def get_version(self):
+        return self.version
+
+    def snapshot(self):
+        with self.lock:
+            adjacency = {node: sorted(edges.items()) for node, edges in self.edges_out.items() if edges}
+            risks = self.broker.get_risky_objects()
+            version = self.version
+        return {"version": version, "adjacency": adjacency, "risks": risks}
+
+    @staticmethod
+    def get_edge_refs(obj):
+        if obj['type'] == "relationship":
+            return obj['source_ref'], obj['target_ref']
+        if obj['type'] == "network-traffic":
+            return tuple(obj[ref] for ref in ("src_ref", "dst_ref") if ref in obj)
+        return None
+
+    # ------------------------------------------------------------------
+    # Indexes
+    # ------------------------------------------------------------------
+
+    def _index(self, obj):
+        if obj['type'] in ("ipv4-addr", "ipv6-addr"):
+            self.addresses.add(obj['value'], obj['id'])
+        refs = self.get_edge_refs(obj)
+        if refs and len(refs) == 2:
+            self.edges_out[refs[0]][obj['id']] = refs[1]
+            self.edges_in[refs[1]][obj['id']] = refs[0]
+        self.search_index.add(obj)
+        self.type_index.add(self._observed(obj))
+
+    def _observed(self, obj):
+        meta = self.broker.read(id=obj['id'])
+        observed = {field: meta[field] for field in ("last_seen", "number_observed") if field in meta}
+        return dict(obj, **observed) if observed else obj
+
+    def _unindex(self, obj):
+        if obj['type'] in ("ipv4-addr", "ipv6-addr"):
+            self.addresses.remove(obj['value'])
+        refs = self.get_edge_refs(obj)
+        if refs and len(refs) == 2:
+            self.edges_out.get(refs[0], {}).pop(obj['id'], None)
+            self.edges_in.get(refs[1], {}).pop(obj['id'], None)
+        self.search_index.remove(obj)
+        self.type_index.remove(obj)
+        self.exportable.pop(obj['id'], None)
 
     # ------------------------------------------------------------------
     # Complex Query Functions
@@ -68,6 +237,9 @@ class CTIDatabase:
     def get_broker(self):
         return self.broker
 
+    def get_events(self):
+        return self.events
+
     def query(self, filters: List[dict]):
         stix_filters = [Filter(**f) if isinstance(f, dict) else f for f in filters]
         data = self._composite.query(stix_filters)
@@ -76,131 +248,170 @@ class CTIDatabase:
         data = [self.read(obj['id']) for obj in data]
         return data
 
-    def get_observable_list(self):
-        return self.query([Filter("type", "!=", "relationship"),Filter("type", "!=", "network-traffic")])
+    def get_observable_types(self):
+        return self.type_index.get_types(exclude=("relationship", "network-traffic"))
+
+    def list_objects(self, types: List[str], sort: str = "id", descending: bool = False, filters: Optional[dict] = None, cursor: Optional[str] = None, offset: int = 0, limit: int = 100) -> dict:
+        filters = dict(filters or {})
+        equals = filters.pop(sort, None)
+        if equals is None and sort == "id":
+            for field in filters:
+                if types and all(field in TypeIndex.get_fields(t) for t in types):
+                    sort, equals = field, filters.pop(field)
+                    break
+        loaded = {}
+        def match(obj_id):
+            obj = self.read(obj_id)
+            if obj is None or any(str(obj.get(field, "")) != value for field, value in filters.items()):
+                return False
+            loaded[obj_id] = obj
+            return True
+        ids, next_cursor = self.type_index.page(types, sort=sort, descending=descending, equals=equals, cursor=cursor, offset=offset, limit=limit, match=match if filters else None)
+        objects = [obj for obj in (loaded.get(obj_id) or self.read(obj_id) for obj_id in ids) if obj]
+        total = self.type_index.count(types) if equals is None and not filters else None
+        return {"objects": objects, "total": total, "next": next_cursor}
 
     def get_all_of_type(self, stix_type: str):
         return self.query([Filter("type", "=", stix_type)])
 
-    def get_object_graph(self, obj_id, search_depth=1, visited_ids=None):
-        if visited_ids is None:
-            visited_ids = set()
-
-        # Skip already processed IDs
-        if obj_id in visited_ids:
-            return {"nodes": [], "edges": []}
-        visited_ids.add(obj_id)
-
-        main_obj = self.read(obj_id)
-        if not main_obj:
-            return {"nodes": [], "edges": []}
-
-        # Add main object to nodes
-        node = {
-            "id": main_obj['id'],
-            "object": main_obj
-        }
-        nodes = [node]
+    def get_successors(self, obj_id: str) -> List[tuple]:
+        with self.lock:
+            return sorted(self.edges_out.get(obj_id, {}).items())
+
+    def get_predecessors(self, obj_id: str) -> List[tuple]:
+        with self.lock:
+            return sorted(self.edges_in.get(obj_id, {}).items())
+
+    def get_address_id(self, value: str) -> Optional[str]:
+        return self.addresses.lookup(value)
+
+    def search(self, query: str, field: Optional[str] = None, mode: str = "exact", limit: int = 100) -> List[dict]:
+        ids = self.search_index.search(query, field=field, mode=mode, limit=limit)
+        return [obj for obj in (self.read(obj_id) for obj_id in ids) if obj]
+
+    def get_addresses_in(self, cidr: str) -> List[dict]:
+        return [obj for obj in (self.read(obj_id) for _, obj_id in self.addresses.search(cidr)) if obj]
+
+    def get_object_graph(self, obj_id, search_depth=1, max_nodes=None, max_edges=None, skip=0, edge_skip=0):
+        if not self.broker.read(id=obj_id):
+            return {"nodes": [], "edges": [], "next": None, "visited": []}
+
+        # Breadth-first expansion, highest risk first within each level. Only
+        # as many candidates as the node budget for this page (and all earlier
+        # ones) allows are kept, and only their edges are recorded
+        limit = None if max_nodes is None else skip + max(max_nodes, 1)
+        max_edges = None if max_edges is None else max(max_edges, 1)
+        position = {obj_id: 0}
+        links = {}
+        level = [obj_id]
+        complete = True
+        for _ in range(max(search_depth, 0)):
+            room = None if limit is None else limit - len(position)
+            heap, pending, order = [], {}, count()
+            for node in level:
+                neighbors = [(edge_id, node, target, target) for edge_id, target in self.get_successors(node)]
+                neighbors += [(edge_id, source, node, source) for edge_id, source in self.get_predecessors(node)]
+                for edge_id, source, target, other in neighbors:
+                    if other in position:
+                        links[edge_id] = (source, target)
+                    elif other in pending:
+                        pending[other].append((edge_id, source, target))
+                    elif room != 0:
+                        meta = self.broker.read(id=other)
+                        if not meta:
+                            continue
+                        entry = (meta.get('risk', 0), -next(order), other)
+                        if room is None or len(heap) < room:
+                            heapq.heappush(heap, entry)
+                        else:
+                            complete = False
+                            if entry <= heap[0]:
+                                continue
+                            del pending[heapq.heapreplace(heap, entry)[2]]
+                        pending[other] = [(edge_id, source, target)]
+                    elif self.broker.read(id=other):
+                        # The budget is spent, one more reachable node is enough to know there is a next page
+                        complete = False
+                        break
+                if room == 0 and not complete:
+                    break
+            level = [node for _, _, node in sorted(heap, reverse=True)]
+            for node in level:
+                position[node] = len(position)
+                for edge_id, source, target in pending[node]:
+                    links[edge_id] = (source, target)
+            if not complete or not level:
+                break
+
+        # Each edge is sent with whichever of its endpoints is sent last
+        owned = defaultdict(list)
+        for edge_id, (source, target) in links.items():
+            if source in position and target in position:
+                owned[max(position[source], position[target])].append(edge_id)
+
+        # A node with more edges than fit on one page sends the rest on the
+        # following pages, resuming at edge_skip within its edge list
+        ordered = list(position)
+        stop = len(ordered) if limit is None else min(limit, len(ordered))
+        page_nodes, page_edges, end = [], [], None
+        for index in range(skip, stop):
+            first = edge_skip if index == skip else 0
+            edge_ids = owned.get(index, [])[first:]
+            if max_edges is not None and len(page_edges) + len(edge_ids) > max_edges:
+                room = max_edges - len(page_edges)
+                if room == 0 or ((page_nodes or page_edges) and first == 0 and len(edge_ids) <= max_edges):
+                    end = (index, first)
+                    break
+                if first == 0:
+                    page_nodes.append(ordered[index])
+                page_edges.extend(edge_ids[:room])
+                end = (index, first + room)
+                break
+            if first == 0:
+                page_nodes.append(ordered[index])
+            page_edges.extend(edge_ids)
+        if end is None and not complete:
+            end = (stop, 0)
+
+        nodes = [{"id": node, "object": obj} for node, obj in ((node, self.read(node)) for node in page_nodes) if obj]
         edges = []
-
-        if search_depth <= 0:
-            return {"nodes": nodes, "edges": edges}
-
-        # Gather relationships in both directions
-        relationships_out = self.query([
-            Filter("type", "=", "relationship"),
-            Filter("source_ref", "=", obj_id)
-        ])
-        relationships_in = self.query([
-            Filter("type", "=", "relationship"),
-            Filter("target_ref", "=", obj_id)
-        ])
-
-        # Gather network-traffic in both directions
-        net_out = self.query([
-            Filter("type", "=", "network-traffic"),
-            Filter("src_ref", "=", obj_id)
-        ])
-        net_in = self.query([
-            Filter("type", "=", "network-traffic"),
-            Filter("dst_ref", "=", obj_id)
-        ])
-
-        children = []
-
-        # Process relationships (both directions)
-        for rel in relationships_out:
-            target = self.read(rel['target_ref'])
-            if target:
-                children.append((target['id'], rel, "relationship"))
-
-        for rel in relationships_in:
-            source = self.read(rel['source_ref'])
-            if source:
-                children.append((source['id'], rel, "relationship"))
-
-        # Process network traffic (both directions)
-        for net in net_out:
-            target = self.read(net['dst_ref'])
-            if target:
-                children.append((target['id'], net, "network-traffic"))
-
-        for net in net_in:
-            source = self.read(net['src_ref'])
-            if source:
-                children.append((source['id'], net, "network-traffic"))
-
-        # Traverse the children to fetch more objects
-        for child_id, relation_obj, link_type in children:
-            # Add edges (relations and network traffic) to the edge list
-            edge = None
-            if relation_obj['type'] == "relationship":
-                edge = {
-                    "id": relation_obj['id'],
-                    "source": relation_obj['source_ref'],
-                    "target": relation_obj['target_ref'],
-                    "type": link_type,
-                    "relation": relation_obj
-                }
-            else:
-                edge = {
-                    "id": relation_obj['id'],
-                    "source": relation_obj['src_ref'],
-                    "target": relation_obj['dst_ref'],
-                    "type": link_type,
-                    "relation": relation_obj 
-                }
-            edges.append(edge)
-
-            # Recursively get child node details
-            child_bundle = self.get_object_graph(
-                child_id,
-                search_depth=search_depth - 1,
-                visited_ids=visited_ids
-            )
-            if child_bundle:
-                nodes.extend(child_bundle["nodes"])
-                edges.extend(child_bundle["edges"])
-
-        # remove duplicates
-        nodes = list({node["id"]: node for node in nodes}.values())
-        edges = list({edge["id"]: edge for edge in edges}.values())
-
-        return {"nodes": nodes, "edges": edges}
-
+        for edge_id in page_edges:
+            relation = self.read(edge_id)
+            if relation:
+                source, target = links[edge_id]
+                edges.append({"id": edge_id, "source": source, "target": target, "type": relation['type'], "relation": relation})
+        next_cursor = self.encode_graph_cursor(obj_id, search_depth, *end) if end is not None else None
+        # Every kept node and edge decides what this page holds, not only the ones sent on it
+        visited = ordered + [edge_id for edge_ids in owned.values() for edge_id in edge_ids]
+        return {"nodes": nodes, "edges": edges, "next": next_cursor, "visited": visited}
+
+    @staticmethod
+    def encode_graph_cursor(root_id, search_depth, skip, edge_skip=0):
+        return base64.urlsafe_b64encode(json.dumps([root_id, search_depth, skip, edge_skip]).encode("utf-8")).decode("ascii")
+
+    @staticmethod
+    def decode_graph_cursor(cursor, root_id, search_depth):
+        try:
+            cursor_root, cursor_depth, skip, edge_skip = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        except (ValueError, TypeError):
+            raise ValueError("Invalid graph cursor")
+        if cursor_root != root_id or cursor_depth != search_depth or not all(isinstance(value, int) and value >= 0 for value in (skip, edge_skip)):
+            raise ValueError("Graph cursor does not match the requested graph")
+        return skip, edge_skip
 
     # ------------------------------------------------------------------
     # Export Functions
     # ------------------------------------------------------------------
 
     def export_bundle(self) -> dict:
-        stix_data = self.query([Filter("type", "!=", "relationship"),
-                                Filter("type", "!=", "network-traffic")])
-        stix_net_traffic = self.query([Filter("type", "=", "network-traffic")])
-        stix_rels = self.query([Filter("type", "=", "relationship")])
-        data = [json.loads(obj.serialize()) for obj in stix_data]
-        rels = [json.loads(obj.serialize()) for obj in stix_rels]
-        traffic = [json.loads(obj.serialize()) for obj in stix_net_traffic]
+        data, rels, traffic = [], [], []
+        for obj in self.iter_objects():
+            if obj['type'] == "relationship":
+                rels.append(obj)
+            elif obj['type'] == "network-traffic":
+                traffic.append(obj)
+            else:
+                data.append(obj)
         return {
             "type": "bundle",
             "id": f"bundle--{uuid4()}",
@@ -209,12 +420,80 @@ class CTIDatabase:
             "network_traffic": traffic
         }
 
-    def export_object_graph(self, root_id, search_depth=1):
-        full_object = self.get_object_graph(root_id, search_depth=search_depth)
-        
+    def iter_objects(self, types: Optional[List[str]] = None, modified_after: Optional[str] = None) -> Iterator[dict]:
+        if modified_after:
+            modified_after = datetime.fromisoformat(modified_after)
+            if modified_after.tzinfo is not None:
+                modified_after = modified_after.astimezone().replace(tzinfo=None)
+            modified_after = modified_after.isoformat()
+        for obj_id in list(self.broker.ids_to_fps):
+            if types and obj_id.split("--", 1)[0] not in types:
+                continue
+            if modified_after and self.broker.read(id=obj_id).get('updated', '') <= modified_after:
+                continue
+            obj = self.export_stix(obj_id)
+            if obj is not None:
+                # Broker metadata is not STIX, so it travels in a single custom property
+                obj['x_icarus'] = {key: value for key, value in self.broker.read(id=obj_id).items() if key not in ("id", "type")}
+                yield obj
+
+    def stream_ndjson(self, types=None, modified_after=None) -> Iterator[str]:
+        for obj in self.iter_objects(types, modified_after):
+            yield json.dumps(obj) + "\n"
+
+    def stream_bundle(self, types=None, modified_after=None) -> Iterator[str]:
+        yield f'{{"type": "bundle", "id": "bundle--{uuid4()}", "objects": ['
+        separator = ""
+        for obj in self.iter_objects(types, modified_after):
+            yield separator + json.dumps(obj)
+            separator = ", "
+        yield "]}"
+
+    def export_stix(self, obj_id):
+        # Records skip stix2 validation on ingest, so each one goes through to_stix once before it is exported
+        obj = self._composite.get(obj_id)
+        if obj is None:
+            return None
+        if not isinstance(obj, Record):
+            return json.loads(obj.serialize())
+        valid = self.exportable.get(obj_id)
+        if valid is None:
+            try:
+                to_stix(obj)
+                valid = True
+            except STIXError:
+                valid = False
+            self.exportable[obj_id] = valid
+        return dict(obj) if valid else None
+
+    def export_path_graph(self, path):
+        nodes, edges = [], []
+        for i, obj_id in enumerate(path):
+            obj = self.read(obj_id)
+            if not obj:
+                continue
+            if i % 2 == 0:
+                nodes.append({"id": obj_id, "object": obj})
+            else:
+                source, target = self.get_edge_refs(obj)
+                edges.append({
+                    "id": obj_id,
+                    "source": source,
+                    "target": target,
+                    "type": obj['type'],
+                    "relation": obj
+                })
+        return {"nodes": nodes, "edges": edges}
+
+    def export_object_graph(self, root_id, search_depth=1, max_nodes=None, max_edges=None, cursor=None):
+        skip, edge_skip = self.decode_graph_cursor(cursor, root_id, search_depth) if cursor else (0, 0)
+        full_object = self.get_object_graph(root_id, search_depth=search_depth, max_nodes=max_nodes, max_edges=max_edges, skip=skip, edge_skip=edge_skip)
+
         return {
             "type": "graph",
             "id": f"graph--{uuid4()}",
             "nodes": full_object["nodes"],
-            "edges": full_object["edges"]
+            "edges": full_object["edges"],
+            "next": full_object["next"],
+            "visited": full_object["visited"]
         }
@@ -1,6 +1,11 @@
 import stix2
 from typing import List, Dict, Optional
-from datetime import datetime
+from datetime import datetime, timezone
+from functools import lru_cache
+from uuid import UUID, uuid5
+
+import json
+import time
 
 
 # ------------------------------------------------------------------
@@ -29,13 +34,14 @@ def create_process(pid, path, cmdline):
         command_line=cmdline
     )
 
-def create_network_traffic(src_ref, dst_ref, src_port, dst_port, protocol):
+def create_network_traffic(src_ref, dst_ref, src_port, dst_port, protocol, start=None):
     return stix2.NetworkTraffic(
         src_ref=src_ref,
         dst_ref=dst_ref,
         src_port=src_port,
         dst_port=dst_port,
-        protocols=protocol
+        protocols=protocol,
+        start=start
     )
 
 def create_observed_data(first_observed, last_observed, number_observed, objects):
@@ -74,4 +80,73 @@ def create_software(name, version, vendor):
         name=name,
         version=version,
         vendor=vendor
-    )
\ No newline at end of file
+    )
+
+# ------------------------------------------------------------------
+# Ingest Records
+# Note: Plain dict objects for trusted agent rows, skipping stix2
+# validation. They serialize to the same STIX JSON as their stix2
+# counterparts and can be converted with to_stix when needed.
+# ------------------------------------------------------------------
+
+_SCO_NAMESPACE = UUID("00abedb4-aa42-466c-9c01-fed23315a9b7")
+
+_ID_PROPERTIES = {
+    "ipv4-addr": ("value",),
+    "ipv6-addr": ("value",),
+    "file": ("hashes", "name"),
+    "network-traffic": ("start", "src_ref", "dst_ref", "src_port", "dst_port", "protocols"),
+}
+
+class Record(dict):
+    __slots__ = ()
+
+def _record_id(stix_type, properties):
+    keys = _ID_PROPERTIES.get(stix_type)
+    if keys is None:
+        contributing = properties
+    else:
+        contributing = {k: properties[k] for k in keys if k in properties}
+        if "hashes" in contributing:
+            hashes = contributing["hashes"]
+            algorithm = next((h for h in ("MD5", "SHA-1", "SHA-256") if h in hashes), next(iter(hashes)))
+            contributing["hashes"] = {algorithm: hashes[algorithm]}
+    canonical = json.dumps(contributing, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return f"{stix_type}--{uuid5(_SCO_NAMESPACE, canonical)}"
+
+def create_record(stix_type, **properties):
+    properties = {k: v for k, v in properties.items() if v is not None}
+    record = Record(type=stix_type, spec_version="2.1", id=_record_id(stix_type, properties))
+    record.update(properties)
+    return record
+
+def create_ipv4_address_record(value):
+    return create_record("ipv4-addr", value=value)
+
+def create_ipv6_address_record(value):
+    return create_record("ipv6-addr", value=value)
+
+def create_process_record(pid, path, cmdline):
+    return create_record("process", pid=int(pid), cwd=path, command_line=cmdline)
+
+def create_file_record(name, size, ctime, mtime, atime, hashes):
+    return create_record("file", name=name, size=size, ctime=ctime, mtime=mtime, atime=atime, hashes=hashes)
+
+def create_network_traffic_record(src_ref, dst_ref, src_port, dst_port, protocol, start=None):
+    protocols = [protocol] if isinstance(protocol, str) else list(protocol)
+    return create_record("network-traffic", start=start, src_ref=src_ref, dst_ref=dst_ref,
+                         src_port=src_port, dst_port=dst_port, protocols=protocols)
+
+def create_relationship_record(source_ref, target_ref, relationship_type):
+    timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+    return create_record("relationship", relationship_type=relationship_type, source_ref=source_ref,
+                         target_ref=target_ref, created=timestamp, modified=timestamp)
+
+def to_stix(obj):
+    if isinstance(obj, Record):
+        return stix2.parse(dict(obj), allow_custom=True)
+    return obj
+
+@lru_cache(maxsize=4096)
+def format_timestamp(timestamp):
+    return time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.localtime(int(timestamp)))
@@ -0,0 +1,45 @@
+from collections import defaultdict
+
+import threading
+
+class EventBus:
+
+    # ------------------------------------------------------------------
+    # Event Bus Configuration
+    # ------------------------------------------------------------------
+
+    EVENTS = ("object-created", "edge-created", "risk-raised", "objects-changed")
+
+    def __init__(self, logger=None):
+        self.subscribers = defaultdict(list)
+        self.lock = threading.Lock()
+        self.logger = logger
+
+    # ------------------------------------------------------------------
+    # Subscriptions
+    # ------------------------------------------------------------------
+
+    def subscribe(self, event, callback):
+        if event not in EventBus.EVENTS:
+            raise ValueError(f"Unknown event: {event}")
+        with self.lock:
+            self.subscribers[event] = self.subscribers[event] + [callback]
+
+    def unsubscribe(self, event, callback):
+        with self.lock:
+            self.subscribers[event] = [cb for cb in self.subscribers[event] if cb != callback]
+
+    def has_subscribers(self, event):
+        return bool(self.subscribers.get(event))
+
+    # ------------------------------------------------------------------
+    # Publishing
+    # ------------------------------------------------------------------
+
+    def publish(self, event, payload):
+        for callback in self.subscribers.get(event, ()):
+            try:
+                callback(event, payload)
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f"Error delivering event '{event}': {e}")
@@ -1,6 +1,12 @@
+from src.taxii_client import TAXIIClient
+from src.feed_stream import FeedStream
 from src.cti_utils import *
 
-from copy import deepcopy
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from itertools import chain
+from hashlib import sha256
+from uuid import UUID
 
 import threading
 import requests
@@ -14,11 +20,27 @@ class FeedManager:
     # Feed Manager Configuration
     # ------------------------------------------------------------------
 
-    def __init__(self, db, logger):
+    def __init__(self, db, logger, interval=60, timeout=30, workers=4, page_size=100, stream=False, chunk_size=65536, batch_size=1000, max_deferred=10000):
         self.feeds = {}
+        self.state = {}
         self.db = db
         self.broker = db.get_broker()
         self.logger = logger
+        self.interval = interval
+        self.timeout = timeout
+        self.workers = workers
+        self.page_size = page_size
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+        self.max_deferred = max_deferred
+        self.running = set()
+        self.lock = threading.Lock()
+        self.ingest_lock = threading.Lock()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
 
     # ------------------------------------------------------------------
     # Feed Management State
@@ -26,6 +48,7 @@ class FeedManager:
 
     def start(self):
         self.logger.info("Initializing FeedManager...")
+        self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="feed")
         self.read_thread = threading.Thread(target=self.read_loop)
         self.read_thread.start()
         self.logger.info("FeedManager started.")
@@ -33,91 +56,273 @@ class FeedManager:
     def stop(self):
         self.logger.info("Stopping FeedManager...")
         self.read_thread.join()
+        self.pool.shutdown()
+        self.session.close()
         self.logger.info("FeedManager stopped.")
 
     # ------------------------------------------------------------------
     # Main Loop
     # ------------------------------------------------------------------
 
-    def check_if_exists(self, obj, origin):
-        dup = deepcopy(obj)
-        risk = dup.pop('risk', None)
-        tlp = dup.pop('tlp', None)
-        exists, obj_id = self.broker.check_if_exists(dup)
+    @staticmethod
+    def valid_item(item):
+        # Feed objects are untrusted, so only well-formed STIX ids and relationships get through
+        if not isinstance(item, dict) or not isinstance(item.get('type'), str) or not isinstance(item.get('id'), str):
+            return False
+        prefix, _, suffix = item['id'].partition("--")
         try:
-            if exists:
-                dup['id'] = obj_id
-                self.broker.update(dup, origin=origin, tlp=tlp, risk=risk)
-        except Exception as e:
-            self.logger.error(f"Error updating object with ID {obj.get('id')}: {e}")
-        return exists, obj_id
+            if prefix != item['type'] or str(UUID(suffix)) != suffix.lower():
+                return False
+        except ValueError:
+            return False
+        if item['type'] == 'relationship':
+            return all(isinstance(item.get(key), str) for key in ("relationship_type", "source_ref", "target_ref"))
+        return True
+
+    def prepare_item(self, item, id_map):
+        obj = {key: id_map.get(value, value) if isinstance(value, str) else value
+               for key, value in item.items() if key not in ("risk", "tlp", "x_icarus")}
+        if obj['type'] == 'relationship':
+            obj = {
+                "type": "relationship",
+                "relationship_type": obj['relationship_type'],
+                "source_ref": obj['source_ref'],
+                "target_ref": obj['target_ref']
+            }
+        return obj
 
-    def parse_object(self, obj, origin):
-        dup = deepcopy(obj)
-        risk = dup.pop('risk', None)
-        tlp = dup.pop('tlp', None)
-        if dup['type'] == 'relationship':
-            dup = create_relationship(dup['source_ref'], dup['target_ref'], dup['relationship_type'])
-        self.db.create(dup, origin=origin, tlp=tlp, risk=risk)
+    def ingest_batch(self, items, origin, id_map=None):
+        id_map = {} if id_map is None else id_map
+        pending = {}
+        entries = []
+        skipped = 0
+        for item in items:
+            if not self.valid_item(item):
+                skipped += 1
+                continue
+            obj = self.prepare_item(item, id_map)
+            fp = self.broker.fingerprint(obj)
+            obj_id = pending.get(fp)
+            if obj_id is None:
+                _, obj_id = self.broker.check_if_exists(obj, fp=fp)
+            if obj_id is None:
+                if obj['type'] == 'relationship':
+                    obj = create_relationship_record(obj['source_ref'], obj['target_ref'], obj['relationship_type'])
+                else:
+                    obj = Record(obj)
+                obj_id = pending[fp] = obj['id']
+            else:
+                obj = Record(obj, id=obj_id)
+            if obj_id != item['id']:
+                id_map[item['id']] = obj_id
+            # Exports of other servers carry risk and tlp under x_icarus
+            extension = item['x_icarus'] if isinstance(item.get('x_icarus'), dict) else {}
+            entries.append((obj, item.get('tlp', extension.get('tlp')), item.get('risk', extension.get('risk')), fp))
+        results = self.db.create_batch(entries, origin=origin)
+        created = sum(1 for new, _ in results if new)
+        self.logger.info(f"Ingested {len(results)} objects from feed '{origin}' ({created} new).")
+        if skipped:
+            self.logger.warning(f"Skipped {skipped} invalid objects from feed '{origin}'.")
+        return results
 
     def parse_feed_data(self, data, origin):
-        objects = data.get('objects', [])
-        traffic = data.get('network_traffic', [])
-        relationships = data.get('relationships', [])
+        return self.parse_feed_page([data], origin)
+
+    def parse_feed_page(self, bundles, origin):
+        return self.ingest_batch(chain.from_iterable(bundle.get(section, []) for bundle in bundles for section in FeedStream.SECTIONS), origin)
+
+    def has_pending_refs(self, item, seen):
+        for key, value in item.items():
+            if key.endswith("_ref") and isinstance(value, str) and value not in seen and not self.broker.read(id=value):
+                return True
+        return False
+
+    def parse_feed_stream(self, items, origin):
         id_map = {}
-        for item in objects + traffic + relationships:
-            self.logger.debug(f"Checking item: {item}")
-            item_id = item['id']
-            exists, obj_id = self.check_if_exists(item, origin)
-            if not exists:
-                for key, value in item.items():
-                    if isinstance(value, str) and value in id_map:
-                        item[key] = id_map[value]
-                self.parse_object(item, origin)
-                self.logger.info(f"Added new object with ID {item_id} from feed '{origin}'.")
-            else:
-                id_map[item_id] = obj_id
+        seen = set()
+        deferred = []
+        dropped = 0
+        batch = []
+        for section, item in items:
+            if not self.valid_item(item):
+                dropped += 1
+                continue
+            if self.has_pending_refs(item, seen):
+                # Forward references are held in memory, so a hostile feed cannot grow them without bound
+                if len(deferred) < self.max_deferred:
+                    deferred.append((section, item))
+                else:
+                    dropped += 1
+                continue
+            batch.append(item)
+            seen.add(item['id'])
+            if len(batch) >= self.batch_size:
+                self.ingest_batch(batch, origin, id_map)
+                batch = []
+        if batch:
+            self.ingest_batch(batch, origin, id_map)
+        if deferred:
+            deferred.sort(key=lambda entry: FeedStream.SECTIONS.index(entry[0]))
+            self.ingest_batch([item for _, item in deferred], origin, id_map)
+            self.logger.info(f"Ingested {len(deferred)} deferred objects from feed '{origin}'.")
+        if dropped:
+            self.logger.warning(f"Dropped {dropped} invalid or unresolvable objects from feed '{origin}' (at most {self.max_deferred} are deferred).")
 
-    def read_feed(self, name, url):
+    def fetch_feed(self, name, params=None, conditional=True):
+        feed = self.feeds[name]
+        state = self.state[name]
+        headers = {}
+        if conditional and state['etag']:
+            headers['If-None-Match'] = state['etag']
+        if conditional and state['last_modified']:
+            headers['If-Modified-Since'] = state['last_modified']
+        self.logger.info(f"Reading feed '{name}' from {feed['url']}...")
+        response = self.session.get(feed['url'], params=params, headers=headers, timeout=feed['timeout'], stream=self.stream)
+        if response.status_code == 304:
+            self.logger.info(f"Feed '{name}' not modified.")
+            response.close()
+            return None
+        if response.status_code != 200:
+            self.logger.error(f"Failed to read feed '{name}' (HTTP {response.status_code}).")
+            response.close()
+            return None
+        # Validators are only saved by the caller once the page has been ingested
+        validators = {"etag": response.headers.get('ETag'), "last_modified": response.headers.get('Last-Modified')} if conditional else None
+        if not conditional or self.stream:
+            return None, validators, response
+        digest = sha256(response.content).digest()
+        if digest == state['digest']:
+            self.logger.info(f"Feed '{name}' unchanged, skipping.")
+            state.update(validators)
+            return None
+        return digest, validators, response
+
+    def read_feed(self, name):
         try:
-            self.logger.info(f"Reading feed '{name}' from {url}...")
-            response = requests.get(url)
+            if self.feeds[name]['type'] == "taxii":
+                pages = self.read_taxii_feed(name)
+            else:
+                pages = self.read_json_feed(name)
+            if pages:
+                self.logger.info(f"Successfully read {pages} page(s) from feed '{name}'.")
+            return pages > 0
         except Exception as e:
             self.logger.error(f"Error reading feed '{name}': {e}")
-        if response.status_code == 200:
-            self.logger.info(f"Successfully read feed '{name}'.")
-            data = response.json()
-            for d in data:
-                self.parse_feed_data(d, name)
-        else:
-            self.logger.error(f"Failed to read feed '{name}'.")
+            return False
+        finally:
+            with self.lock:
+                self.running.discard(name)
+                if name in self.state:
+                    self.state[name]['next_run'] = time.time() + self.feeds[name]['interval']
+
+    def read_taxii_feed(self, name):
+        state = self.state[name]
+        if state['client'] is None:
+            feed = self.feeds[name]
+            state['client'] = TAXIIClient(feed['url'], session=self.session, timeout=feed['timeout'], logger=self.logger)
+        client = state['client']
+        pages = 0
+        for collection in client.get_collection_urls():
+            # Later pages may reference objects whose ids were remapped on an earlier page
+            id_map = {}
+            for objects, last_added in client.iter_objects(collection, added_after=state['cursors'].get(collection), limit=self.page_size):
+                objects.sort(key=lambda obj: self.section_order(obj.get('type') if isinstance(obj, dict) else None))
+                with self.ingest_lock:
+                    self.ingest_batch(objects, name, id_map)
+                if last_added:
+                    state['cursors'][collection] = last_added
+                pages += 1
+        return pages
+
+    @staticmethod
+    def section_order(stix_type):
+        if stix_type == "relationship":
+            return 2
+        if stix_type == "network-traffic":
+            return 1
+        return 0
+
+    def read_json_feed(self, name):
+        state = self.state[name]
+        params = {"limit": self.page_size}
+        if state['cursor']:
+            params['added_after'] = state['cursor']
+        pages = 0
+        while True:
+            fetched = self.fetch_feed(name, params=params, conditional='next' not in params)
+            if fetched is None:
+                break
+            digest, validators, response = fetched
+            more, next = False, None
+            with response:
+                if self.stream:
+                    parser = FeedStream(response.iter_content(chunk_size=self.chunk_size))
+                    with self.ingest_lock:
+                        self.parse_feed_stream(parser.items(), name)
+                    more, next = parser.meta.get('more', False), parser.meta.get('next')
+                else:
+                    data = response.json()
+                    if isinstance(data, dict):
+                        more, next = data.get('more', False), data.get('next')
+                        data = data.get('objects', [])
+                    with self.ingest_lock:
+                        self.parse_feed_page(data, name)
+            if response.headers.get('X-TAXII-Date-Added-Last'):
+                state['cursor'] = response.headers['X-TAXII-Date-Added-Last']
+            if digest:
+                state['digest'] = digest
+            if validators:
+                state.update(validators)
+            pages += 1
+            if not more or not next:
+                break
+            params = dict(params, next=next)
+        return pages
+
+    def schedule_feeds(self):
+        now = time.time()
+        with self.lock:
+            due = [name for name, state in self.state.items() if name not in self.running and state['next_run'] <= now]
+            self.running.update(due)
+        for name in due:
+            self.pool.submit(self.read_feed, name)
 
     def read_loop(self):
         while True:
-            for name, url in self.feeds.items():
-                self.read_feed(name, url)
-            time.sleep(60)
+            self.schedule_feeds()
+            time.sleep(1)
 
     # ------------------------------------------------------------------
     # CRUD Operations
     # ------------------------------------------------------------------
 
-    def create(self, name, url):
+    def create(self, name, url, interval=None, timeout=None, feed_type=None):
+        if feed_type not in (None, "json", "taxii"):
+            raise ValueError(f"Unknown feed type: {feed_type}")
         self.logger.info(f"Creating feed '{name}' with URL: {url}")
-        self.feeds[name] = url
+        with self.lock:
+            self.feeds[name] = {
+                "url": url,
+                "type": feed_type or "json",
+                "interval": interval or self.interval,
+                "timeout": timeout or self.timeout
+            }
+            self.state[name] = {"etag": None, "last_modified": None, "digest": None, "cursor": None, "cursors": {}, "client": None, "next_run": 0}
 
     def read(self, name):
         return self.feeds.get(name)
 
-    def update(self, name, url):
+    def update(self, name, url, interval=None, timeout=None):
         if name in self.feeds:
             self.logger.info(f"Updating feed '{name}' to URL: {url}")
-            self.feeds[name] = url
+            self.create(name, url, interval=interval or self.feeds[name]['interval'], timeout=timeout or self.feeds[name]['timeout'], feed_type=self.feeds[name]['type'])
 
     def remove(self, name):
         if name in self.feeds:
             self.logger.info(f"Removing feed '{name}'")
-            del self.feeds[name]
+            with self.lock:
+                del self.feeds[name]
+                del self.state[name]
 
     # ------------------------------------------------------------------
     # Query Operations
@@ -0,0 +1,140 @@
+import codecs
+import json
+
+class FeedStream:
+
+    # ------------------------------------------------------------------
+    # Feed Stream Configuration
+    # Note: Accepts a plain list of bundles or a {more, next, objects}
+    # envelope and yields (section, object) pairs without holding the
+    # whole body in memory.
+    # ------------------------------------------------------------------
+
+    SECTIONS = ("objects", "network_traffic", "relationships")
+
+    _WHITESPACE = " \t\n\r"
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decoder = json.JSONDecoder()
+        self.utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.meta = {}
+
+    # ------------------------------------------------------------------
+    # Structure
+    # ------------------------------------------------------------------
+
+    def items(self):
+        if self._peek() == "[":
+            yield from self._array(self._bundle)
+        else:
+            yield from self._object(self._envelope)
+        if self._peek() is not None:
+            raise ValueError("Unexpected data after feed body")
+
+    def _envelope(self, key):
+        if key == "objects":
+            yield from self._array(self._bundle)
+        else:
+            self.meta[key] = self._value()
+
+    def _bundle(self):
+        yield from self._object(self._section)
+
+    def _section(self, key):
+        if key in FeedStream.SECTIONS:
+            yield from self._array(lambda: self._item(key))
+        else:
+            self._value()
+
+    def _item(self, section):
+        yield section, self._value()
+
+    def _array(self, handler):
+        self._expect("[")
+        if self._peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield from handler()
+            char = self._next()
+            if char == "]":
+                return
+            if char != ",":
+                raise ValueError(f"Expected ',' or ']' in feed array, got {char!r}")
+
+    def _object(self, handler):
+        self._expect("{")
+        if self._peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self._value()
+            self._expect(":")
+            yield from handler(key)
+            char = self._next()
+            if char == "}":
+                return
+            if char != ",":
+                raise ValueError(f"Expected ',' or '}}' in feed object, got {char!r}")
+
+    # ------------------------------------------------------------------
+    # Scanning
+    # ------------------------------------------------------------------
+
+    def _fill(self):
+        if self.eof:
+            return False
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.eof = True
+            chunk = self.utf8.decode(b"", final=True)
+        elif isinstance(chunk, bytes):
+            chunk = self.utf8.decode(chunk)
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def _peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in FeedStream._WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return None
+
+    def _next(self):
+        char = self._peek()
+        if char is None:
+            raise ValueError("Unexpected end of feed body")
+        self.pos += 1
+        return char
+
+    def _expect(self, expected):
+        char = self._next()
+        if char != expected:
+            raise ValueError(f"Expected {expected!r} in feed body, got {char!r}")
+
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                after = end
+                while after < len(self.buffer) and self.buffer[after] in FeedStream._WHITESPACE:
+                    after += 1
+                delimiter = self.buffer[after:after + 1]
+                if delimiter in (",", "]", "}", ":") or (self.eof and not delimiter):
+                    self.pos = end
+                    return value
+                if self.eof:
+                    raise ValueError(f"Unexpected {delimiter!r} in feed body")
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            if not self._fill():
+                raise ValueError("Unexpected end of feed body")
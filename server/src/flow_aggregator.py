@@ -0,0 +1,56 @@
+from src.cti_utils import *
+
+from datetime import datetime, timezone
+
+import threading
+import time
+
+class FlowAggregator:
+
+    # ------------------------------------------------------------------
+    # Flow Aggregator Configuration
+    # ------------------------------------------------------------------
+
+    def __init__(self, db, window=300):
+        self.db = db
+        self.broker = db.get_broker()
+        self.window = window
+        self.flows = {}
+        self.current_window = None
+        self.lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Flow Handling
+    # ------------------------------------------------------------------
+
+    def get_window(self, timestamp):
+        return int(timestamp) - int(timestamp) % self.window
+
+    def observe(self, src_id, dst_id, dst_port, protocol, origin, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        window = self.get_window(timestamp)
+        key = (src_id, dst_id, dst_port, protocol, window)
+        new = False
+        with self.lock:
+            if window != self.current_window:
+                self.expire(window)
+            obj_id = self.flows.get(key)
+            if obj_id is None:
+                start = datetime.fromtimestamp(window, tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+                flow = create_network_traffic_record(src_id, dst_id, None, dst_port, protocol, start=start)
+                new, obj_id = self.db.create(flow, origin=origin, tlp="red")
+                self.flows[key] = obj_id
+            self.broker.set_observed(obj_id, timestamp)
+        return new, obj_id
+
+    def expire(self, window):
+        self.flows = {key: obj_id for key, obj_id in self.flows.items() if key[-1] >= window}
+        self.current_window = window
+
+    # ------------------------------------------------------------------
+    # Query Functions
+    # ------------------------------------------------------------------
+
+    def get_active_flows(self):
+        return len(self.flows)
@@ -1,10 +1,12 @@
+from src.log_tailer import LogTailer
 from src.server import Server
 
 from flask import *
+from hashlib import blake2b
 import matplotlib.pyplot as plt
 import networkx as nx
+import queue
 import json
-import time
 import io
 import os
 
@@ -19,6 +21,7 @@ class Interface:
         self.app = Flask(__name__, template_folder=template_folder)
         self.server = server
         self.logfile = logfile
+        self.logs = LogTailer(logfile, logger=server.get_logger())
         self.collectors = {}
         self.rules = {}
         self.alerts = []
@@ -33,8 +36,59 @@ class Interface:
         self.app.run(**kwargs)
 
     def stop(self):
+        self.logs.stop()
         self.app.shutdown()
 
+    # ------------------------------------------------------------------
+    # Listing Helpers
+    # ------------------------------------------------------------------
+
+    _LIST_ARGS = ("limit", "offset", "cursor", "sort", "order", "format", "type")
+
+    def list_args(self):
+        order = request.args.get('order', default='asc')
+        if order not in ('asc', 'desc'):
+            raise ValueError("order must be asc or desc")
+        return {
+            "sort": request.args.get('sort', default='id'),
+            "descending": order == 'desc',
+            "filters": {key: value for key, value in request.args.items() if key not in Interface._LIST_ARGS},
+            "cursor": request.args.get('cursor'),
+            "offset": max(request.args.get('offset', default=0, type=int), 0),
+            "limit": min(max(request.args.get('limit', default=100, type=int), 1), 1000)
+        }
+
+    def render_list(self, template, page, args):
+        if request.args.get('format') == 'json':
+            return jsonify(page)
+        params = {key: value for key, value in request.args.items() if key not in ('cursor', 'offset')}
+        next_url = url_for(request.endpoint, cursor=page['next'], **params) if page['next'] else None
+        first_url = url_for(request.endpoint, **params) if args['cursor'] or args['offset'] else None
+        return render_template(template, data=page['objects'], total=page['total'], next_url=next_url, first_url=first_url)
+
+    # ------------------------------------------------------------------
+    # Cached Responses
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def graph_ids(bundle):
+        # Paged graphs list every node and edge that decided the page, so a change anywhere in them drops it
+        visited = bundle.pop('visited', None)
+        if visited is not None:
+            return visited
+        return [node['id'] for node in bundle['nodes']] + [edge['id'] for edge in bundle['edges']]
+
+    def cached_response(self, key, build, tag=None, mimetype='text/html', render=None):
+        etag, body = self.server.get_response_cache().fetch(key, build, tag=tag)
+        if render is not None:
+            # Volatile fields are rendered around the cached part on every request
+            body = render(body)
+            etag = blake2b(body.encode("utf-8"), digest_size=16).hexdigest()
+        response = Response(body, mimetype=mimetype)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
+
     # ------------------------------------------------------------------
     # Routes
     # ------------------------------------------------------------------
@@ -57,6 +111,27 @@ class Interface:
         def data_index():
             return render_template('data.html')
 
+        @self.app.route('/data/export', methods=['GET'])
+        def export_data():
+            format = request.args.get('format', default='ndjson')
+            if format not in ('ndjson', 'stix'):
+                return render_template('error.html', code=400, title='Invalid Format', description='Supported export formats are ndjson and stix.'), 400
+            types = [t for arg in request.args.getlist('type') for t in arg.split(',') if t]
+            modified_after = request.args.get('modified_after')
+            try:
+                chunks = self.server.stream_all_data(format=format, types=types or None, modified_after=modified_after)
+                first = next(chunks, "")
+            except ValueError:
+                return render_template('error.html', code=400, title='Invalid Timestamp', description='modified_after must be an ISO 8601 timestamp.'), 400
+            def generate():
+                yield first
+                yield from chunks
+            if format == 'stix':
+                mimetype, filename = 'application/stix+json;version=2.1', 'export.json'
+            else:
+                mimetype, filename = 'application/x-ndjson', 'export.ndjson'
+            return Response(stream_with_context(generate()), mimetype=mimetype, headers={'Content-Disposition': f'attachment; filename={filename}'})
+
         # ------------------------------------------------------------------
         # Alerts
         # ------------------------------------------------------------------
@@ -67,8 +142,19 @@ class Interface:
 
         @self.app.route('/alerts/type/<type>', methods=['GET'])
         def get_alerts_by_type(type):
-            alerts = self.server.get_alerts_by_type(type)
-            return render_template('tables/alerts.html', type=type, alerts=alerts)
+            subnet = request.args.get('subnet')
+            offset = max(request.args.get('offset', default=0, type=int), 0)
+            limit = max(request.args.get('limit', default=1000, type=int), 1)
+            try:
+                alerts = self.server.get_alerts_by_type(type, subnet=subnet, offset=offset, limit=limit)
+            except ValueError:
+                return render_template('error.html', code=400, title='Invalid Subnet', description='The subnet must be written in CIDR notation.'), 400
+            total = self.server.count_alerts(type) if not subnet else None
+            return render_template('tables/alerts.html', type=type, alerts=alerts, offset=offset, limit=limit, total=total, subnet=subnet)
+
+        @self.app.route('/alerts/metrics', methods=['GET'])
+        def get_alert_metrics():
+            return jsonify(self.server.get_alert_metrics())
 
         @self.app.route('/alerts/id/<alert_id>', methods=['GET'])
         def get_alert(alert_id):
@@ -79,7 +165,10 @@ class Interface:
                 "Agent Affected": alert['agent'],
                 "Estimated Risk Level": alert['risk'],
                 "Timestamp": alert['timestamp'],
-                "Malicious Object": alert['object']
+                "Malicious Object": alert['object'],
+                "Status": alert['status'],
+                "Paths Observed": alert.get('path_count', 1),
+                "Last Seen": alert.get('last_seen', alert['timestamp'])
             }
             object_list = []
             for id in alert['path']:
@@ -91,7 +180,16 @@ class Interface:
                     if obj['id'] == id:
                         object_list.append(obj['relation'])
                         break
-            return render_template('details/alert.html', alert=alert_details, objs=object_list, bundle=alert['graph'])
+            return render_template('details/alert.html', alert_id=alert['id'], status=alert['status'], alert=alert_details, objs=object_list, bundle=alert['graph'])
+
+        @self.app.route('/alerts/id/<alert_id>/<action>', methods=['POST'])
+        def set_alert_status(alert_id, action):
+            statuses = {'resolve': 'resolved', 'dismiss': 'dismissed', 'reopen': 'active'}
+            if action not in statuses:
+                return render_template('error.html', code=404, title='Page Not Found', description='The page you are looking for does not exist.'), 404
+            if not self.server.set_alert_status(alert_id, statuses[action]):
+                return render_template('error.html', code=404, title='Alert Not Found', description='The alert you are looking for does not exist.'), 404
+            return redirect(f'/alerts/id/{alert_id}')
 
         # ------------------------------------------------------------------
         # Observables
@@ -99,17 +197,62 @@ class Interface:
 
         @self.app.route('/data/observables', methods=['GET'])
         def get_observables():
-            data = self.server.get_observables()
-            if data:
-                return render_template('tables/observables.html', data=data)
-            return render_template('tables/observables.html', data=[])
+            types = [t for arg in request.args.getlist('type') for t in arg.split(',') if t]
+            try:
+                args = self.list_args()
+                page = self.server.get_observables(types=types or None, **args)
+            except ValueError as e:
+                return render_template('error.html', code=400, title='Invalid Listing', description=str(e)), 400
+            return self.render_list('tables/observables.html', page, args)
 
         @self.app.route('/data/observables/<object_id>', methods=['GET'])
         def get_observable_detail(object_id):
-            data,bundle = self.server.get_observable(object_id)
-            if data:
-                return render_template('details/observable.html', item=data, bundle=bundle)
-            return render_template('error.html', code=404, title='Page Not Found', description='The page you are looking for does not exist.')
+            if not self.server.check_for_object(object_id):
+                return render_template('error.html', code=404, title='Page Not Found', description='The page you are looking for does not exist.')
+            def build():
+                data,bundle = self.server.get_observable(object_id)
+                ids = [object_id] + self.graph_ids(bundle)
+                return render_template('details/observable.html', item=data, bundle=bundle, more_url=f'/data/observables/{object_id}/data'), ids
+            return self.cached_response(('observable', object_id, 1), build)
+
+        @self.app.route('/data/observables/<object_id>/data', methods=['GET'])
+        def get_observable_graph(object_id):
+            if not self.server.check_for_object(object_id):
+                return jsonify({"error": "Object not found"}), 404
+            cursor = request.args.get('cursor')
+            def build():
+                _, bundle = self.server.get_observable(object_id, cursor=cursor)
+                ids = [object_id] + self.graph_ids(bundle)
+                return json.dumps(bundle), ids
+            try:
+                return self.cached_response(('observable-data', object_id, 1, cursor), build, mimetype='application/json')
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+
+        @self.app.route('/data/search', methods=['GET'])
+        def search_observables():
+            query = request.args.get('q')
+            if not query:
+                return render_template('error.html', code=400, title='Missing Query', description='Provide a search term with the q parameter.'), 400
+            field = request.args.get('field')
+            mode = request.args.get('mode', default='exact')
+            limit = request.args.get('limit', default=100, type=int)
+            try:
+                data = self.server.search_observables(query, field=field, mode=mode, limit=limit)
+            except ValueError as e:
+                return render_template('error.html', code=400, title='Invalid Search', description=str(e)), 400
+            return jsonify(data)
+
+        @self.app.route('/data/addresses', methods=['GET'])
+        def get_addresses():
+            cidr = request.args.get('cidr')
+            if not cidr:
+                return render_template('error.html', code=400, title='Missing Subnet', description='Provide a subnet with the cidr parameter.'), 400
+            try:
+                data = self.server.get_addresses(cidr)
+            except ValueError:
+                return render_template('error.html', code=400, title='Invalid Subnet', description='The subnet must be written in CIDR notation.'), 400
+            return jsonify(data)
 
         # ------------------------------------------------------------------
         # Relationships
@@ -117,10 +260,12 @@ class Interface:
 
         @self.app.route('/data/relationships', methods=['GET'])
         def get_relationships():
-            data = self.server.get_relationships()
-            if data:
-                return render_template('tables/relationships.html', data=data)
-            return render_template('tables/relationships.html', data=[])
+            try:
+                args = self.list_args()
+                page = self.server.get_relationships(**args)
+            except ValueError as e:
+                return render_template('error.html', code=400, title='Invalid Listing', description=str(e)), 400
+            return self.render_list('tables/relationships.html', page, args)
 
         @self.app.route('/data/relationships/<relationship_id>', methods=['GET'])
         def get_relationship_detail(relationship_id):
@@ -135,10 +280,12 @@ class Interface:
 
         @self.app.route('/data/traffic', methods=['GET'])
         def get_traffic():
-            data = self.server.get_traffic()
-            if data:
-                return render_template('tables/traffic.html', data=data)
-            return render_template('tables/traffic.html', data=[])
+            try:
+                args = self.list_args()
+                page = self.server.get_traffic(**args)
+            except ValueError as e:
+                return render_template('error.html', code=400, title='Invalid Listing', description=str(e)), 400
+            return self.render_list('tables/traffic.html', page, args)
 
         @self.app.route('/data/traffic/<traffic_id>', methods=['GET'])
         def get_traffic_detail(traffic_id):
@@ -162,8 +309,15 @@ class Interface:
             if not self.server.check_for_agent(agent_id):
                 return render_template('error.html', code=404, title='Agent Not Found', description='The agent you are looking for does not exist.')
             depth = request.args.get('depth', default=2, type=int)
-            bundle = self.server.get_agent_graph(agent_id, search_depth=depth)
-            return jsonify(bundle)
+            cursor = request.args.get('cursor')
+            def build():
+                bundle = self.server.get_agent_graph(agent_id, search_depth=depth, cursor=cursor)
+                ids = [agent_id] + self.graph_ids(bundle)
+                return json.dumps(bundle), ids
+            try:
+                return self.cached_response(('agent-data', agent_id, depth, cursor), build, mimetype='application/json')
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
 
         @self.app.route('/agents/<agent_id>', methods=['GET'])
         def get_agent(agent_id):
@@ -171,8 +325,12 @@ class Interface:
             if not agent:
                 return render_template('error.html', code=404, title='Agent Not Found', description='The agent you are looking for does not exist.')
             depth = request.args.get('depth', default=2, type=int)
-            bundle = self.server.get_agent_graph(agent_id, search_depth=depth)
-            return render_template('details/agent.html', agent=agent, bundle=bundle)
+            def build():
+                bundle = self.server.get_agent_graph(agent_id, search_depth=depth)
+                ids = [agent_id] + self.graph_ids(bundle)
+                return render_template('details/agent_graph.html', bundle=bundle, more_url=f'/agents/{agent_id}/data?depth={depth}'), ids
+            # Only the graph is cached, the agent fields (last_seen moves on every check-in) are rendered per request
+            return self.cached_response(('agent', agent_id, depth), build, render=lambda graph: render_template('details/agent.html', agent=agent, graph=graph))
 
         # ------------------------------------------------------------------
         # Collectors 
@@ -188,6 +346,14 @@ class Interface:
                 return render_template('error.html', code=404, title='Page Not Found', description='The page you are looking for does not exist.')
             return render_template('error.html', code=503, title='Service Unavailable', description='This page is still under development.')
 
+        # ------------------------------------------------------------------
+        # System Metrics
+        # ------------------------------------------------------------------
+
+        @self.app.route('/system/metrics', methods=['GET'])
+        def get_system_metrics():
+            return jsonify(dict(self.server.get_system_metrics(), logs=self.logs.get_stats()))
+
         # ------------------------------------------------------------------
         # System Logs
         # ------------------------------------------------------------------
@@ -198,19 +364,18 @@ class Interface:
 
         @self.app.route('/system/logs/stream')
         def stream_logs():
+            lines = self.logs.subscribe()
             def generate():
-                with open(self.logfile, 'r') as f:
-                    lines = f.readlines()
-                    lines = lines[-100:]  
-                    for line in lines:
-                        yield f"data: {line.strip()}\n\n"
-                    f.seek(0, os.SEEK_END) 
+                try:
                     while True:
-                        line = f.readline()
-                        if line:
-                            yield f"data: {line.strip()}\n\n"
-                        else:
-                            time.sleep(0.5)
+                        try:
+                            line = lines.get(timeout=15)
+                        except queue.Empty:
+                            yield ": keepalive\n\n"
+                            continue
+                        yield f"data: {line.strip()}\n\n"
+                finally:
+                    self.logs.unsubscribe(lines)
             return Response(stream_with_context(generate()), mimetype='text/event-stream')
 
         # ------------------------------------------------------------------
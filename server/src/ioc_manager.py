@@ -0,0 +1,75 @@
+from hashlib import blake2b
+
+import ipaddress
+import threading
+import time
+import json
+
+class IOCManager:
+
+    # ------------------------------------------------------------------
+    # IOC Manager Configuration
+    # ------------------------------------------------------------------
+
+    _HASH_FIELDS = {"MD5": "md5", "SHA-1": "sha1", "SHA-256": "sha256"}
+
+    def __init__(self, db, min_risk=50, refresh=10):
+        self.db = db
+        self.broker = db.get_broker()
+        self.min_risk = min_risk
+        self.refresh = refresh
+        self.version = 0
+        self.iocs = self.empty()
+        self.digest = None
+        self.compiled_at = 0
+        self.lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Compilation
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def empty():
+        return {"ipv4": [], "ipv6": [], "md5": [], "sha1": [], "sha256": []}
+
+    def compile(self):
+        iocs = {key: set() for key in self.empty()}
+        for obj_id, risk in self.broker.get_risky_objects().items():
+            if risk < self.min_risk:
+                continue
+            stix_type = obj_id.split("--", 1)[0]
+            if stix_type not in ("ipv4-addr", "ipv6-addr", "file"):
+                continue
+            obj = self.db.read(obj_id)
+            if obj is None:
+                continue
+            if stix_type == "file":
+                for algorithm, value in (obj.get('hashes') or {}).items():
+                    if algorithm in IOCManager._HASH_FIELDS:
+                        iocs[IOCManager._HASH_FIELDS[algorithm]].add(value.lower())
+            else:
+                try:
+                    address = ipaddress.ip_address(obj['value'])
+                except (KeyError, ValueError):
+                    continue
+                iocs[f"ipv{address.version}"].add(int(address))
+        return {key: sorted(values) for key, values in iocs.items()}
+
+    def get_iocs(self):
+        with self.lock:
+            now = time.time()
+            if now - self.compiled_at >= self.refresh:
+                self.compiled_at = now
+                iocs = self.compile()
+                digest = blake2b(json.dumps(iocs).encode("utf-8"), digest_size=16).digest()
+                if digest != self.digest:
+                    self.digest = digest
+                    self.iocs = iocs
+                    self.version += 1
+            return dict(self.iocs, version=self.version)
+
+    def get_version(self):
+        return self.get_iocs()['version']
+
+    def count(self):
+        return {key: len(values) for key, values in self.iocs.items()}
@@ -0,0 +1,199 @@
+from collections import deque
+
+import threading
+import queue
+import time
+import os
+
+try:
+    from inotify_simple import INotify, flags
+except ImportError:
+    INotify = None
+
+class LogTailer:
+
+    # ------------------------------------------------------------------
+    # Log Tailer Configuration
+    # Note: One reader follows the log file (across rotations) and fans
+    # every line out to the subscribers' bounded queues, so the number of
+    # viewers does not change how often the file is read.
+    # ------------------------------------------------------------------
+
+    def __init__(self, path, history=100, queue_size=1000, poll=0.5, logger=None):
+        self.path = path
+        self.history = deque(maxlen=history)
+        self.queue_size = max(queue_size, history)
+        self.poll = poll
+        self.logger = logger
+        self.subscribers = set()
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.running = False
+        self.generation = 0
+        self.thread = None
+        self.notifier = None
+
+    # ------------------------------------------------------------------
+    # Subscriptions
+    # ------------------------------------------------------------------
+
+    def subscribe(self):
+        lines = queue.Queue(maxsize=self.queue_size)
+        with self.lock:
+            self._start()
+            for line in self.history:
+                lines.put_nowait(line)
+            self.subscribers.add(lines)
+        return lines
+
+    def unsubscribe(self, lines):
+        with self.lock:
+            self.subscribers.discard(lines)
+            if not self.subscribers:
+                # Nobody is watching, the next subscriber starts a fresh tailer
+                self.running = False
+
+    def get_stats(self):
+        with self.lock:
+            return {"subscribers": len(self.subscribers), "buffered": len(self.history), "dropped": self.dropped, "inotify": self.notifier is not None}
+
+    # ------------------------------------------------------------------
+    # Tailer State
+    # ------------------------------------------------------------------
+
+    def start(self):
+        with self.lock:
+            self._start()
+
+    def _start(self):
+        if self.running:
+            return
+        self.running = True
+        self.generation += 1
+        self.history.clear()
+        self.thread = threading.Thread(target=self.tail_loop, args=(self.generation,), daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.lock:
+            self.running = False
+            thread = self.thread
+        if thread:
+            thread.join(timeout=self.poll * 2)
+        with self.lock:
+            if self.notifier is not None:
+                self.notifier.close()
+                self.notifier = None
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+
+    def tail_loop(self, generation):
+        notifier = self.watch()
+        with self.lock:
+            self.notifier = notifier
+        log, partial = None, ""
+        while self.running and self.generation == generation:
+            try:
+                if log is None:
+                    log = self.open(seek_end=not self.history)
+                    partial = ""
+                if log is not None:
+                    partial = self.read_lines(log, partial)
+                    if self.rotated(log):
+                        partial = self.read_lines(log, partial)
+                        if partial:
+                            self.publish(partial)
+                        log.close()
+                        log = self.open(seek_end=False)
+                        partial = ""
+                        continue
+            except OSError as e:
+                if self.logger:
+                    self.logger.error(f"Error tailing {self.path}: {e}")
+                if log is not None:
+                    log.close()
+                log = None
+            self.wait(notifier)
+        if log is not None:
+            log.close()
+        with self.lock:
+            if self.notifier is notifier:
+                self.notifier = None
+        if notifier is not None:
+            notifier.close()
+
+    def open(self, seek_end):
+        try:
+            log = open(self.path, 'r', errors='replace')
+        except FileNotFoundError:
+            return None
+        if seek_end:
+            for line in self.read_tail(log):
+                self.publish(line)
+            log.seek(0, os.SEEK_END)
+        return log
+
+    def read_tail(self, log, block=65536):
+        size = log.seek(0, os.SEEK_END)
+        log.seek(max(size - block, 0))
+        lines = log.read().splitlines()
+        if size > block and lines:
+            lines = lines[1:]
+        return lines[-self.history.maxlen:]
+
+    def read_lines(self, log, partial):
+        chunk = log.read()
+        if not chunk:
+            return partial
+        lines = (partial + chunk).split("\n")
+        for line in lines[:-1]:
+            self.publish(line.rstrip("\r"))
+        return lines[-1]
+
+    def rotated(self, log):
+        try:
+            current = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        opened = os.fstat(log.fileno())
+        return current.st_ino != opened.st_ino or current.st_size < log.tell()
+
+    def publish(self, line):
+        with self.lock:
+            self.history.append(line)
+            for lines in self.subscribers:
+                try:
+                    lines.put_nowait(line)
+                except queue.Full:
+                    # Slow viewers lose their oldest lines, never block the tailer
+                    try:
+                        lines.get_nowait()
+                    except queue.Empty:
+                        pass
+                    lines.put_nowait(line)
+                    self.dropped += 1
+
+    # ------------------------------------------------------------------
+    # Change Notification
+    # ------------------------------------------------------------------
+
+    def watch(self):
+        if INotify is None:
+            return None
+        try:
+            notifier = INotify()
+            notifier.add_watch(os.path.dirname(os.path.abspath(self.path)), flags.MODIFY | flags.CREATE | flags.MOVED_TO | flags.MOVED_FROM | flags.DELETE)
+            return notifier
+        except OSError as e:
+            if self.logger:
+                self.logger.warning(f"inotify unavailable for {self.path}, polling instead: {e}")
+            return None
+
+    def wait(self, notifier):
+        # The timeout doubles as a fallback for changes inotify cannot see
+        if notifier is None:
+            time.sleep(self.poll)
+        else:
+            notifier.read(timeout=int(self.poll * 1000))
@@ -0,0 +1,137 @@
+from collections import defaultdict, deque
+
+import heapq
+
+class PathEngine:
+
+    # ------------------------------------------------------------------
+    # Path Engine Configuration
+    # ------------------------------------------------------------------
+
+    def __init__(self, depth_multiplier=3, max_length=8, max_paths=10, max_expansions=10000):
+        self.depth_multiplier = depth_multiplier
+        self.max_length = max_length
+        self.max_paths = max_paths
+        self.max_expansions = max_expansions
+
+    # ------------------------------------------------------------------
+    # Graph Handling
+    # ------------------------------------------------------------------
+
+    def build_adjacency(self, edges):
+        adj = defaultdict(list)
+        for edge in edges:
+            adj[edge["source"]].append((edge["id"], edge["target"]))
+        for neighbors in adj.values():
+            neighbors.sort()
+        return adj
+
+    def local_adjacency(self, successors, start_id, max_length):
+        reached = {start_id: 0}
+        adj = {}
+        queue = deque([start_id])
+        while queue:
+            current = queue.popleft()
+            if reached[current] >= max_length:
+                continue
+            adj[current] = list(successors(current))
+            for _, neighbor in adj[current]:
+                if neighbor not in reached:
+                    reached[neighbor] = reached[current] + 1
+                    queue.append(neighbor)
+        return adj, reached
+
+    def reverse_distances(self, adj, end_id, max_length):
+        reverse = defaultdict(list)
+        for src, neighbors in adj.items():
+            for _, dst in neighbors:
+                reverse[dst].append(src)
+        distances = {end_id: 0}
+        queue = deque([end_id])
+        while queue:
+            current = queue.popleft()
+            if distances[current] >= max_length:
+                continue
+            for neighbor in reverse.get(current, ()):
+                if neighbor not in distances:
+                    distances[neighbor] = distances[current] + 1
+                    queue.append(neighbor)
+        return distances
+
+    # ------------------------------------------------------------------
+    # Path Finding
+    # ------------------------------------------------------------------
+
+    def find_paths(self, adj, start_id, end_id, max_length=None, max_paths=None):
+        max_length = self.max_length if max_length is None else min(max_length, self.max_length)
+        max_paths = self.max_paths if max_paths is None else max_paths
+        distances = self.reverse_distances(adj, end_id, max_length)
+        if start_id not in distances or start_id == end_id:
+            return []
+        paths = []
+        expansions = 0
+        queue = [(distances[start_id], (start_id,), frozenset((start_id,)))]
+        while queue and len(paths) < max_paths and expansions < self.max_expansions:
+            _, path, visited = heapq.heappop(queue)
+            expansions += 1
+            current = path[-1]
+            hops = len(path) // 2
+            if current == end_id:
+                paths.append(list(path))
+                continue
+            for rel_id, neighbor in adj.get(current, ()):
+                if neighbor in visited:
+                    continue
+                estimate = hops + 1 + distances.get(neighbor, max_length + 1)
+                if estimate > max_length:
+                    continue
+                heapq.heappush(queue, (estimate, path + (rel_id, neighbor), visited | {neighbor}))
+        return paths
+
+    def propagate(self, predecessors, sources, targets, threshold):
+        # One labelled BFS from every risky source at once: each (node, source) label keeps the
+        # parent of its shortest, and so best scoring, path back to the source, and each node's
+        # predecessors are read once per depth for all sources still in range. Only that best
+        # path is reported per pair, so unlike find_paths this mode does not honour max_paths
+        limits = {}
+        for source, risk in sources.items():
+            limit = min(self.max_useful_length(risk, threshold), self.max_length)
+            if limit >= 1:
+                limits[source] = limit
+        parents = {(source, source): None for source in limits}
+        frontier = {source: [source] for source in limits}
+        depth = 0
+        while frontier:
+            depth += 1
+            reached = defaultdict(list)
+            for node in sorted(frontier):
+                for edge_id, neighbor in predecessors(node):
+                    for source in frontier[node]:
+                        if (neighbor, source) in parents:
+                            continue
+                        parents[(neighbor, source)] = (edge_id, node)
+                        if depth < limits[source]:
+                            reached[neighbor].append(source)
+            frontier = reached
+        results = {}
+        for node, source in parents:
+            if node in targets and node != source:
+                results[(node, source)] = [self.trace(parents, node, source)]
+        return results
+
+    def trace(self, parents, node, source):
+        path = [node]
+        while node != source:
+            edge_id, node = parents[(node, source)]
+            path += [edge_id, node]
+        return path
+
+    # ------------------------------------------------------------------
+    # Scoring
+    # ------------------------------------------------------------------
+
+    def score(self, risk, path):
+        return int(min((risk * self.depth_multiplier * 2) / (len(path) - 1), 100))
+
+    def max_useful_length(self, risk, threshold):
+        return int((risk * self.depth_multiplier) // max(int(threshold) + 1, 1))
@@ -1,3 +1,4 @@
+from src.flow_aggregator import FlowAggregator
 from src.agent_manager import AgentManager
 from src.cti_db import CTIDatabase
 from src.cti_utils import *
@@ -12,12 +13,14 @@ class QueryManager:
     # Query Manager Configuration
     # ------------------------------------------------------------------
     
-    def __init__(self, query_file, db, am, logger):
+    def __init__(self, query_file, db, am, logger, flow_window=300):
         self._queries = {}
+        self._agent_queries = {}
         self.cti_db = db
         self.broker = self.cti_db.get_broker()
         self.agent_db = am
         self.logger = logger
+        self.flows = FlowAggregator(db, window=flow_window)
         if query_file:
             with open(query_file, 'rb') as f:
                 data = f.read()
@@ -56,13 +59,18 @@ class QueryManager:
     # Extra Functions
     # ------------------------------------------------------------------
 
-    def export_all_queries(self):
+    def export_all_queries(self, agent=None):
+        enabled = self._agent_queries.get(agent)
         queries = {}
         for name, data in self._queries.items():
-            if data['enabled']:
+            if (name in enabled) if enabled is not None else data['enabled']:
                 queries[name] = data['query']
         return queries
 
+    def get_agent_id(self, ip):
+        agent = self.agent_db.get_by_ip(ip)
+        return agent['obj_id'] if agent else None
+
     def update_rules(self, risks):
         for name, data in self._queries.items():
             current = data['enabled']
@@ -76,6 +84,17 @@ class QueryManager:
             if current != self._queries[name]['enabled']:
                 self.logger.info(f"Query '{name}' enabled state changed from {current} to {self._queries[name]['enabled']}")
 
+    def update_agent_rules(self, agent_risks):
+        for agent, risks in agent_risks.items():
+            enabled = {name for name, data in self._queries.items() if data['threshold'] <= risks.get(data['type'], 0)}
+            current = self._agent_queries.get(agent)
+            if enabled != current:
+                self._agent_queries[agent] = enabled
+                if current is not None:
+                    self.logger.info(f"Query set for agent {agent} changed to {sorted(enabled)}")
+        for agent in set(self._agent_queries) - set(agent_risks):
+            del self._agent_queries[agent]
+
     # ------------------------------------------------------------------
     # Query Handling
     # ------------------------------------------------------------------    
@@ -83,9 +102,9 @@ class QueryManager:
     def parse_query(self, stix_type, data, agent):
         try:
             if stix_type == "ipv4-addr":
-                return create_ipv4_address(data['value'])
+                return create_ipv4_address_record(data['value'])
             elif stix_type == "process":
-                return create_process(data['pid'], data['path'], data['cmdline'])
+                return create_process_record(data['pid'], data['path'], data['cmdline'])
             elif stix_type == "vulnerability":
                 return create_vulnerability(data['name'], data['description'], data.get('external_references'))
             elif stix_type == "file":
@@ -94,27 +113,38 @@ class QueryManager:
                     "SHA-1": data['sha1'],
                     "SHA-256": data['sha256']
                 }
-                ctime = datetime.fromtimestamp(int(data['ctime'])).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
-                mtime = datetime.fromtimestamp(int(data['mtime'])).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
-                atime = datetime.fromtimestamp(int(data['atime'])).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
-                return create_file(data['path'], int(data['size']), ctime, mtime, atime, hashes)
-            elif stix_type == "network-traffic":
-                src_ref = create_ipv4_address(data['local_address'])
-                new,src_id = self.cti_db.create(src_ref, origin=agent, tlp="red")
-                if new:
-                    self.logger.info(f"Added new source {data['local_address']} with ID {src_id} to CTI database.")
-                dst_ref = create_ipv4_address(data['remote_address'])
-                new,dst_id = self.cti_db.create(dst_ref, origin=agent, tlp="red")
-                if new:
-                    self.logger.info(f"Added new destination {data['remote_address']} with ID {dst_id} to CTI database.")
-                return create_network_traffic(src_id, dst_id, data['local_port'], data['remote_port'], data['protocol'])
+                ctime = format_timestamp(data['ctime'])
+                mtime = format_timestamp(data['mtime'])
+                atime = format_timestamp(data['atime'])
+                return create_file_record(data['path'], int(data['size']), ctime, mtime, atime, hashes)
             else:
                 print(f"Unknown STIX type: {stix_type}")
                 return None
         except Exception as e:
             print(f"Error parsing object: {e}")
             return None
-                
+
+    def parse_address(self, value, agent):
+        obj_id = self.cti_db.get_address_id(value)
+        if obj_id:
+            return False, obj_id
+        if ":" in value:
+            return self.cti_db.create(create_ipv6_address_record(value), origin=agent, tlp="red")
+        return self.cti_db.create(create_ipv4_address_record(value), origin=agent, tlp="red")
+
+    def parse_flow(self, data, agent):
+        try:
+            new,src_id = self.parse_address(data['local_address'], agent)
+            if new:
+                self.logger.info(f"Added new source {data['local_address']} with ID {src_id} to CTI database.")
+            new,dst_id = self.parse_address(data['remote_address'], agent)
+            if new:
+                self.logger.info(f"Added new destination {data['remote_address']} with ID {dst_id} to CTI database.")
+            return self.flows.observe(src_id, dst_id, int(data['remote_port']), data['protocol'], agent)
+        except Exception as e:
+            print(f"Error parsing flow: {e}")
+            return False, None
+
     def apply_query(self, agent, name, data=None):
         query = self._queries.get(name)
         if not query:
@@ -129,20 +159,28 @@ class QueryManager:
         if not isinstance(data, list):
             data = [data] if data else []
 
-        for item in data:
-            obj = self.parse_query(query['type'], item, agent['name'])
-            new,obj_id = self.cti_db.create(obj, origin = agent['name'], tlp="red")
-            if new:
-                self.logger.info(f"Added object {obj_id} of type {query['type']} to CTI database.")
-            if query['type'] in ["process", "file"]:
-                rel = create_relationship(agent['obj_id'], obj_id, query['relationship'])
-                new, rel_id = self.cti_db.create(rel, origin=agent['name'], tlp="red")
+        # Observations on a busy flow would otherwise invalidate cached responses once per row
+        with self.cti_db.batch_changes():
+            for item in data:
+                if query['type'] == "network-traffic":
+                    new,obj_id = self.parse_flow(item, agent['name'])
+                    if not new:
+                        continue
+                    obj = self.cti_db.read(obj_id)
+                else:
+                    obj = self.parse_query(query['type'], item, agent['name'])
+                    new,obj_id = self.cti_db.create(obj, origin = agent['name'], tlp="red")
                 if new:
-                    self.broker.set_history(agent['obj_id'], f"{datetime.now().isoformat()}: Detected {query['relationship']} relationship from {rel_id} to {obj_id}.")
-                    self.broker.set_history(obj_id, f"{datetime.now().isoformat()}: Detected {query['relationship']} relationship from {rel_id} to {agent['obj_id']}.")
-                    self.logger.info(f"Created relationship {rel_id} between agent {agent['obj_id']} and object {obj_id}.")
-            elif query['type'] == "network-traffic" and new:
-                self.broker.set_history(agent['obj_id'], f"{datetime.now().isoformat()}: Detected network traffic {obj_id} {obj['src_ref']} > {query['relationship']} > {obj['dst_ref']}")
-                self.broker.set_history(obj['src_ref'], f"{datetime.now().isoformat()}: Detected network traffic {obj_id} {obj['src_ref']} > {query['relationship']} > {obj['dst_ref']}")
-                self.broker.set_history(obj['dst_ref'], f"{datetime.now().isoformat()}: Detected network traffic {obj_id} {obj['dst_ref']} < {query['relationship']} < {obj['src_ref']}")
-                self.logger.info(f"Created network traffic object {obj_id} between {obj['src_ref']} and {obj['dst_ref']}.")
\ No newline at end of file
+                    self.logger.info(f"Added object {obj_id} of type {query['type']} to CTI database.")
+                if query['type'] in ["process", "file"]:
+                    rel = create_relationship(agent['obj_id'], obj_id, query['relationship'])
+                    new, rel_id = self.cti_db.create(rel, origin=agent['name'], tlp="red")
+                    if new:
+                        self.broker.set_history(agent['obj_id'], f"{datetime.now().isoformat()}: Detected {query['relationship']} relationship from {rel_id} to {obj_id}.")
+                        self.broker.set_history(obj_id, f"{datetime.now().isoformat()}: Detected {query['relationship']} relationship from {rel_id} to {agent['obj_id']}.")
+                        self.logger.info(f"Created relationship {rel_id} between agent {agent['obj_id']} and object {obj_id}.")
+                elif query['type'] == "network-traffic" and new:
+                    self.broker.set_history(agent['obj_id'], f"{datetime.now().isoformat()}: Detected network traffic {obj_id} {obj['src_ref']} > {query['relationship']} > {obj['dst_ref']}")
+                    self.broker.set_history(obj['src_ref'], f"{datetime.now().isoformat()}: Detected network traffic {obj_id} {obj['src_ref']} > {query['relationship']} > {obj['dst_ref']}")
+                    self.broker.set_history(obj['dst_ref'], f"{datetime.now().isoformat()}: Detected network traffic {obj_id} {obj['dst_ref']} < {query['relationship']} < {obj['src_ref']}")
+                    self.logger.info(f"Created network flow {obj_id} between {obj['src_ref']} and {obj['dst_ref']} on port {obj['dst_port']}.")
\ No newline at end of file
@@ -0,0 +1,53 @@
+from stix2.datastore import DataSource
+from stix2.datastore.filters import FilterSet, apply_common_filters
+
+class RecordSource(DataSource):
+
+    # ------------------------------------------------------------------
+    # Record Source Configuration
+    # ------------------------------------------------------------------
+
+    def __init__(self):
+        super().__init__()
+        self._data = {}
+
+    # ------------------------------------------------------------------
+    # CRUD Operations
+    # ------------------------------------------------------------------
+
+    def add(self, record):
+        self._data[record['id']] = record
+
+    def delete(self, obj_id):
+        return self._data.pop(obj_id, None) is not None
+
+    def contains(self, obj_id):
+        return obj_id in self._data
+
+    # ------------------------------------------------------------------
+    # DataSource Interface
+    # ------------------------------------------------------------------
+
+    def get(self, stix_id, _composite_filters=None):
+        record = self._data.get(stix_id)
+        if record is None:
+            return None
+        if self.filters or _composite_filters:
+            query = FilterSet(self.filters)
+            if _composite_filters:
+                query.add(_composite_filters)
+            if not list(apply_common_filters([record], query)):
+                return None
+        return record
+
+    def all_versions(self, stix_id, _composite_filters=None):
+        record = self.get(stix_id, _composite_filters=_composite_filters)
+        return [record] if record else []
+
+    def query(self, query=None, _composite_filters=None):
+        query = FilterSet(query)
+        if self.filters:
+            query.add(self.filters)
+        if _composite_filters:
+            query.add(_composite_filters)
+        return list(apply_common_filters(self._data.values(), query))
@@ -0,0 +1,98 @@
+from collections import OrderedDict, defaultdict, deque
+from hashlib import blake2b
+
+import threading
+
+class ResponseCache:
+
+    # ------------------------------------------------------------------
+    # Response Cache Configuration
+    # Note: Entries remember the object ids they were built from and are
+    # dropped as soon as the database reports a change to any of them, so
+    # writes elsewhere in the graph do not flush unrelated responses.
+    # ------------------------------------------------------------------
+
+    def __init__(self, events, capacity=256):
+        self.capacity = max(int(capacity), 1)
+        self.entries = OrderedDict()
+        self.by_id = defaultdict(set)
+        self.sequence = 0
+        self.recent = deque(maxlen=1024)
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        events.subscribe("objects-changed", self.on_change)
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def fetch(self, key, build, tag=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry['tag'] == tag:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry['etag'], entry['body']
+            self.misses += 1
+            sequence = self.sequence
+        body, ids = build()
+        etag = blake2b(body.encode("utf-8") if isinstance(body, str) else body, digest_size=16).hexdigest()
+        ids = set(ids)
+        with self.lock:
+            if not self._changed_since(sequence, ids):
+                self._store(key, {"etag": etag, "body": body, "tag": tag, "ids": ids})
+        return etag, body
+
+    def get_stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "capacity": self.capacity, "hits": self.hits, "misses": self.misses}
+
+    # ------------------------------------------------------------------
+    # Invalidation
+    # ------------------------------------------------------------------
+
+    def on_change(self, event, payload):
+        with self.lock:
+            self.sequence += 1
+            self.recent.append((self.sequence, payload['ids']))
+            for obj_id in payload['ids']:
+                for key in self.by_id.pop(obj_id, ()):
+                    self._drop(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.by_id.clear()
+            self.recent.clear()
+            self.sequence += 1
+
+    # ------------------------------------------------------------------
+    # Utils
+    # ------------------------------------------------------------------
+
+    def _changed_since(self, sequence, ids):
+        if self.sequence == sequence:
+            return False
+        if not self.recent or self.recent[0][0] > sequence + 1:
+            return True
+        return any(obj_id in ids for seq, changed in self.recent if seq > sequence for obj_id in changed)
+
+    def _store(self, key, entry):
+        self._drop(key)
+        self.entries[key] = entry
+        for obj_id in entry['ids']:
+            self.by_id[obj_id].add(key)
+        while len(self.entries) > self.capacity:
+            self._drop(next(iter(self.entries)))
+
+    def _drop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for obj_id in entry['ids']:
+            keys = self.by_id.get(obj_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.by_id[obj_id]
@@ -0,0 +1,111 @@
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+import threading
+
+class SearchIndex:
+
+    # ------------------------------------------------------------------
+    # Search Index Configuration
+    # ------------------------------------------------------------------
+
+    _HASH_FIELDS = {"MD5": "md5", "SHA-1": "sha1", "SHA-256": "sha256"}
+
+    _FIELDS = ("md5", "sha1", "sha256", "path", "cmdline", "name")
+
+    def __init__(self):
+        self.postings = {field: defaultdict(set) for field in SearchIndex._FIELDS}
+        self.keys = {field: [] for field in SearchIndex._FIELDS}
+        self.lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # CRUD Operations
+    # ------------------------------------------------------------------
+
+    def add(self, obj):
+        entries = self.extract(obj)
+        if not entries:
+            return False
+        with self.lock:
+            for field, value in entries:
+                postings = self.postings[field]
+                if value not in postings:
+                    insort(self.keys[field], value)
+                postings[value].add(obj['id'])
+        return True
+
+    def remove(self, obj):
+        entries = self.extract(obj)
+        if not entries:
+            return False
+        with self.lock:
+            for field, value in entries:
+                postings = self.postings[field]
+                ids = postings.get(value)
+                if not ids:
+                    continue
+                ids.discard(obj['id'])
+                if not ids:
+                    del postings[value]
+                    keys = self.keys[field]
+                    del keys[bisect_left(keys, value)]
+        return True
+
+    # ------------------------------------------------------------------
+    # Query Functions
+    # ------------------------------------------------------------------
+
+    def search(self, query, field=None, mode="exact", limit=100):
+        fields = [field] if field else SearchIndex._FIELDS
+        if any(f not in self.postings for f in fields):
+            raise ValueError(f"Unknown search field: {field}")
+        if mode not in ("exact", "prefix"):
+            raise ValueError(f"Unknown search mode: {mode}")
+        results = []
+        with self.lock:
+            for f in fields:
+                value = self.normalize(f, query)
+                if mode == "exact":
+                    results.extend(sorted(self.postings[f].get(value, ())))
+                else:
+                    keys = self.keys[f]
+                    i = bisect_left(keys, value)
+                    while i < len(keys) and keys[i].startswith(value) and len(results) < limit:
+                        results.extend(sorted(self.postings[f][keys[i]]))
+                        i += 1
+                if len(results) >= limit:
+                    break
+        return list(dict.fromkeys(results))[:limit]
+
+    def get_fields(self):
+        return list(SearchIndex._FIELDS)
+
+    # ------------------------------------------------------------------
+    # Utils
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def normalize(field, value):
+        if field in ("md5", "sha1", "sha256"):
+            return value.lower()
+        return value
+
+    @staticmethod
+    def extract(obj):
+        entries = []
+        stix_type = obj['type']
+        if stix_type == "file":
+            for algorithm, value in (obj.get('hashes') or {}).items():
+                if algorithm in SearchIndex._HASH_FIELDS:
+                    entries.append((SearchIndex._HASH_FIELDS[algorithm], value.lower()))
+            if obj.get('name'):
+                entries.append(("path", obj['name']))
+        elif stix_type == "process":
+            if obj.get('cwd'):
+                entries.append(("path", obj['cwd']))
+            if obj.get('command_line'):
+                entries.append(("cmdline", obj['command_line']))
+        elif stix_type in ("identity", "vulnerability"):
+            if obj.get('name'):
+                entries.append(("name", obj['name']))
+        return entries
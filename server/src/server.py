@@ -3,6 +3,8 @@ from src.agent_manager import AgentManager
 from src.alert_manager import AlertManager
 from src.query_manager import QueryManager
 from src.feed_manager import FeedManager
+from src.ioc_manager import IOCManager
+from src.response_cache import ResponseCache
 from src.cti_db import CTIDatabase
 from src.cti_utils import *
 
@@ -29,6 +31,8 @@ class Server:
         self.agents = AgentManager()
         self.alerts = None
         self.feeds = None
+        self.iocs = None
+        self.responses = None
         self.load_config(config)
 
     def load_config(self, config):
@@ -38,6 +42,11 @@ class Server:
         if server_config is None:
             raise ValueError("Server configuration not found in provided config file")
         self.heartbeat = server_config.getint('heartbeat', 60)
+        self.flow_window = server_config.getint('flow_window', 300)
+        self.graph_max_nodes = server_config.getint('graph_max_nodes', 500)
+        self.graph_max_edges = server_config.getint('graph_max_edges', 2000)
+        self.iocs = IOCManager(self.db, min_risk=server_config.getint('ioc_min_risk', 50))
+        self.responses = ResponseCache(self.db.get_events(), capacity=server_config.getint('response_cache', 256))
         self.set_server_args(
             host=server_config.get('host', None),
             interface=server_config.get('interface', None),
@@ -67,14 +76,48 @@ class Server:
                 self.agents.create(agent_name, agent_obj_id, internal_ip, external_ip)
                 self.logger.info(f"Agent created: {agent_name} with ID: {agent_obj_id}")
 
-        self.feeds = FeedManager(db=self.db, logger=self.logger)
+        self.feeds = FeedManager(
+            db=self.db,
+            logger=self.logger,
+            interval=server_config.getint('feed_interval', 60),
+            timeout=server_config.getfloat('feed_timeout', 30),
+            workers=server_config.getint('feed_workers', 4),
+            page_size=server_config.getint('feed_page_size', 100),
+            stream=server_config.getboolean('feed_stream', False)
+        )
 
         if 'feeds' in cfg_parser:
-            for feed_name, feed_url in cfg_parser['feeds'].items():
-                self.feeds.create(feed_name, feed_url)
-
-        self.query_manager = QueryManager(server_config.get('queryfile', 'data/queries/osq.json'),db=self.db, am=self.agents, logger=self.logger)
-        self.alerts = AlertManager(db=self.db, agents=self.agents, qm=self.query_manager, logger=self.logger)
+            for feed_name, feed_value in cfg_parser['feeds'].items():
+                feed_url, *options = feed_value.split("|")
+                interval = int(options[0]) if len(options) > 0 and options[0] else None
+                timeout = float(options[1]) if len(options) > 1 and options[1] else None
+                feed_type = options[2] if len(options) > 2 and options[2] else None
+                self.feeds.create(feed_name, feed_url, interval=interval, timeout=timeout, feed_type=feed_type)
+
+        self.query_manager = QueryManager(server_config.get('queryfile', 'data/queries/osq.json'),db=self.db, am=self.agents, logger=self.logger, flow_window=self.flow_window)
+        alert_config = cfg_parser['alerts'] if 'alerts' in cfg_parser else {}
+        self.alerts = AlertManager(
+            db=self.db,
+            agents=self.agents,
+            qm=self.query_manager,
+            logger=self.logger,
+            alert_file=alert_config.get('alertfile'),
+            threshold=int(alert_config.get('threshold', 40)),
+            depth_multiplier=int(alert_config.get('depth_multiplier', 3)),
+            depth_threshold=int(alert_config.get('depth_threshold', 5)),
+            decay=int(alert_config.get('decay', 1)),
+            max_path_length=int(alert_config.get('max_path_length', 8)),
+            max_paths=int(alert_config.get('max_paths', 10)),
+            mode=alert_config.get('mode', 'incremental'),
+            path_ttl=int(alert_config['path_ttl']) if 'path_ttl' in alert_config else None,
+            workers=int(alert_config['workers']) if 'workers' in alert_config else None,
+            event_driven=str(alert_config.get('events', 'false')).lower() in ('1', 'true', 'yes', 'on'),
+            sweep_interval=int(alert_config.get('sweep_interval', 300)),
+            coalesce=float(alert_config.get('coalesce', 0.05)),
+            group_window=int(alert_config.get('group_window', 600)),
+            group_by=alert_config.get('group_by', 'object'),
+            group_prefix=int(alert_config.get('group_prefix', 2))
+        )
 
 
     def set_server_args(self, host=None, interface=None, cert=None, key=None):
@@ -111,7 +154,8 @@ class Server:
             port=self.server_port,
             certfile=self.server_cert,
             keyfile=self.server_key,
-            queries=self.query_manager
+            queries=self.query_manager,
+            iocs=self.iocs
         )
         self.feeds.start()
         self.alerts.start()
@@ -136,24 +180,47 @@ class Server:
 
     def get_log_location(self):
         return self.log_file
+
+    def get_logger(self):
+        return self.logger
     
     def get_interface(self):
         return self.server_interface_ip, self.server_interface_port
 
+    def get_response_cache(self):
+        return self.responses
+
     def get_all_data(self):
         return self.db.export_bundle()
 
-    def get_observables(self):
-        return self.db.get_observable_list()
+    def stream_all_data(self, format="ndjson", types=None, modified_after=None):
+        if format == "stix":
+            return self.db.stream_bundle(types=types, modified_after=modified_after)
+        return self.db.stream_ndjson(types=types, modified_after=modified_after)
+
+    def get_observables(self, types=None, sort="id", descending=False, filters=None, cursor=None, offset=0, limit=100):
+        observable_types = self.db.get_observable_types()
+        if types:
+            observable_types = [t for t in observable_types if t in types]
+        return self.db.list_objects(observable_types, sort=sort, descending=descending, filters=filters, cursor=cursor, offset=offset, limit=limit)
 
-    def get_observable(self, observable_id):
-        return self.db.read(observable_id),self.db.export_object_graph(observable_id,1)
+    def check_for_object(self, obj_id):
+        return self.db.read(obj_id) is not None
 
-    def get_traffic(self):
-        return self.db.get_all_of_type("network-traffic")
+    def get_observable(self, observable_id, cursor=None):
+        return self.db.read(observable_id),self.db.export_object_graph(observable_id, 1, max_nodes=self.graph_max_nodes, max_edges=self.graph_max_edges, cursor=cursor)
 
-    def get_relationships(self):
-        return self.db.get_all_of_type("relationship")
+    def search_observables(self, query, field=None, mode="exact", limit=100):
+        return self.db.search(query, field=field, mode=mode, limit=limit)
+
+    def get_addresses(self, cidr):
+        return self.db.get_addresses_in(cidr)
+
+    def get_traffic(self, sort="id", descending=False, filters=None, cursor=None, offset=0, limit=100):
+        return self.db.list_objects(["network-traffic"], sort=sort, descending=descending, filters=filters, cursor=cursor, offset=offset, limit=limit)
+
+    def get_relationships(self, sort="id", descending=False, filters=None, cursor=None, offset=0, limit=100):
+        return self.db.list_objects(["relationship"], sort=sort, descending=descending, filters=filters, cursor=cursor, offset=offset, limit=limit)
 
     def get_rel_obj(self, obj_id):
         obj=self.db.read(obj_id)
@@ -175,8 +242,8 @@ class Server:
     def get_agent(self, agent_id):
         return self.agents.read(agent_id)
 
-    def get_agent_graph(self, agent_id, search_depth=2):
-        return self.db.export_object_graph(agent_id, search_depth=search_depth)
+    def get_agent_graph(self, agent_id, search_depth=2, cursor=None):
+        return self.db.export_object_graph(agent_id, search_depth=search_depth, max_nodes=self.graph_max_nodes, max_edges=self.graph_max_edges, cursor=cursor)
 
     def check_for_agent(self, agent_id):
         return self.agents.check_for_agent(agent_id)
@@ -187,15 +254,32 @@ class Server:
     def get_alerts(self):
         return self.alerts.get_all_alerts()
 
-    def get_alerts_by_type(self, alert_type):
-        if alert_type == "active":
-            return self.alerts.get_active_alerts()
-        elif alert_type == "resolved":
-            return self.alerts.get_resolved_alerts()
-        elif alert_type == "dismissed":
-            return self.alerts.get_dismissed_alerts()
-        else:
+    def get_alerts_by_type(self, alert_type, subnet=None, offset=0, limit=None):
+        if alert_type not in ("active", "resolved", "dismissed"):
             return []
+        if subnet:
+            addresses = {obj_id for _, obj_id in self.db.addresses.search(subnet)}
+            alerts = [alert for alert in self.alerts.get_alerts(alert_type) if addresses.intersection(alert['path'])]
+            return alerts[offset:None if limit is None else offset + limit]
+        return self.alerts.get_alerts(alert_type, offset=offset, limit=limit)
+
+    def count_alerts(self, alert_type):
+        return self.alerts.count_alerts(alert_type)
+
+    def set_alert_status(self, alert_id, status):
+        if status == "resolved":
+            return self.alerts.resolve(alert_id)
+        elif status == "dismissed":
+            return self.alerts.dismiss(alert_id)
+        elif status == "active":
+            return self.alerts.reopen(alert_id)
+        return False
 
     def get_alert_by_id(self, alert_id):
-        return self.alerts.get_alert_by_id(alert_id)
\ No newline at end of file
+        return self.alerts.get_alert_by_id(alert_id)
+
+    def get_alert_metrics(self):
+        return self.alerts.get_metrics()
+
+    def get_system_metrics(self):
+        return {"broker": self.db.get_broker().get_memory_stats(), "responses": self.responses.get_stats()}
\ No newline at end of file
@@ -14,7 +14,7 @@ class ServerChannel:
     # Configuration of Communication Channel
     # ------------------------------------------------------------------
 
-    def __init__(self, host='0.0.0.0', port=65432, certfile='data/certs/server.pem', keyfile='data/certs/server.key', logfile='/var/log/mon-server/server.log', queries=None, logger=None):
+    def __init__(self, host='0.0.0.0', port=65432, certfile='data/certs/server.pem', keyfile='data/certs/server.key', logfile='/var/log/mon-server/server.log', queries=None, iocs=None, logger=None):
         self.host = host
         self.port = port
         self.certfile = certfile
@@ -23,6 +23,7 @@ class ServerChannel:
         self.server_socket = None
         self.is_running = False
         self.queries = queries
+        self.iocs = iocs
         if logger:
             self.logger = logger
         else:
@@ -114,13 +115,20 @@ class ServerChannel:
     def handle_client(self, connstream, addr):
         self.clients.append(connstream)
         try:
-            current_queries = self.queries.export_all_queries() if self.queries else {}
+            agent = self.queries.get_agent_id(addr[0]) if self.queries else None
+            current_queries = self.queries.export_all_queries(agent) if self.queries else {}
             self.send(connstream, type="upd", data=current_queries)
+            ioc_version = None
             while True:
-                at_queries = self.queries.export_all_queries() if self.queries else {}
+                at_queries = self.queries.export_all_queries(agent) if self.queries else {}
                 if at_queries != current_queries:
                     self.send(connstream, type="upd", data=at_queries)
                     current_queries = at_queries
+                if self.iocs:
+                    iocs = self.iocs.get_iocs()
+                    if iocs['version'] != ioc_version:
+                        self.send(connstream, type="ioc", data=iocs)
+                        ioc_version = iocs['version']
                 data = self.recv_message(connstream)
                 if not data:
                     break
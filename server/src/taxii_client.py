@@ -0,0 +1,87 @@
+from urllib.parse import urljoin
+
+import requests
+
+class TAXIIClient:
+
+    # ------------------------------------------------------------------
+    # TAXII Client Configuration
+    # ------------------------------------------------------------------
+
+    MEDIA_TYPE = "application/taxii+json;version=2.1"
+
+    def __init__(self, url, session=None, timeout=30, logger=None):
+        self.url = url if url.endswith("/") else url + "/"
+        self.session = session or requests.Session()
+        self.timeout = timeout
+        self.logger = logger
+        self.collections = None
+
+    # ------------------------------------------------------------------
+    # Requests
+    # ------------------------------------------------------------------
+
+    def get(self, url, params=None):
+        response = self.session.get(url, params=params, headers={"Accept": TAXIIClient.MEDIA_TYPE}, timeout=self.timeout)
+        if response.status_code != 200:
+            raise ValueError(f"TAXII request to {url} failed (HTTP {response.status_code})")
+        content_type = response.headers.get("Content-Type", "")
+        if not content_type.startswith("application/taxii+json"):
+            raise ValueError(f"TAXII request to {url} returned unexpected media type '{content_type}'")
+        return response
+
+    # ------------------------------------------------------------------
+    # Discovery
+    # ------------------------------------------------------------------
+
+    def discover(self):
+        return self.get(self.url).json()
+
+    def get_api_roots(self):
+        discovery = self.discover()
+        roots = discovery.get("api_roots", [])
+        default = discovery.get("default")
+        if default and default in roots:
+            roots = [default] + [root for root in roots if root != default]
+        return [urljoin(self.url, root if root.endswith("/") else root + "/") for root in roots]
+
+    def get_collections(self, api_root):
+        collections = self.get(urljoin(api_root, "collections/")).json().get("collections", [])
+        return [collection for collection in collections if collection.get("can_read", False)]
+
+    def get_collection_urls(self):
+        if self.collections is None:
+            if "/collections/" in self.url:
+                self.collections = [self.url]
+            else:
+                api_roots = self.get_api_roots()
+                if not api_roots:
+                    raise ValueError(f"TAXII server at {self.url} advertises no API roots")
+                self.collections = [urljoin(api_roots[0], f"collections/{collection['id']}/") for collection in self.get_collections(api_roots[0])]
+                if self.logger:
+                    self.logger.info(f"Discovered {len(self.collections)} readable TAXII collections at {api_roots[0]}")
+        return self.collections
+
+    # ------------------------------------------------------------------
+    # Objects
+    # ------------------------------------------------------------------
+
+    def get_objects(self, collection_url, added_after=None, next=None, limit=None):
+        params = {}
+        if added_after:
+            params["added_after"] = added_after
+        if next:
+            params["next"] = next
+        if limit:
+            params["limit"] = limit
+        response = self.get(urljoin(collection_url, "objects/"), params=params)
+        return response.json(), response.headers.get("X-TAXII-Date-Added-Last")
+
+    def iter_objects(self, collection_url, added_after=None, limit=None):
+        next = None
+        while True:
+            envelope, last_added = self.get_objects(collection_url, added_after=added_after, next=next, limit=limit)
+            yield envelope.get("objects", []), last_added
+            next = envelope.get("next")
+            if not envelope.get("more") or not next:
+                return
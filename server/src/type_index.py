@@ -0,0 +1,186 @@
+from src.address_index import AddressIndex
+
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from itertools import islice
+
+import heapq
+import base64
+import threading
+import json
+
+class TypeIndex:
+
+    # ------------------------------------------------------------------
+    # Type Index Configuration
+    # Note: Every object is kept in one sorted (key, id) list per sortable
+    # field of its type, so pages are read by bisecting and walking these
+    # lists instead of filtering the whole store.
+    # ------------------------------------------------------------------
+
+    _SORT_FIELDS = {
+        "relationship": {"relationship_type": str, "source_ref": str, "target_ref": str},
+        "network-traffic": {"src_ref": str, "dst_ref": str, "dst_port": int, "number_observed": int, "last_seen": str},
+        "ipv4-addr": {"value": AddressIndex.sort_key},
+        "ipv6-addr": {"value": AddressIndex.sort_key},
+    }
+
+    _MATCH_CHUNK = 256
+
+    _OBSERVABLE_FIELDS = {"value": str}
+
+    def __init__(self):
+        self.sorted = defaultdict(lambda: defaultdict(list))
+        self.lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # CRUD Operations
+    # ------------------------------------------------------------------
+
+    def add(self, obj):
+        with self.lock:
+            lists = self.sorted[obj['type']]
+            for field, key in self.extract(obj):
+                insort(lists[field], (key, obj['id']))
+
+    def remove(self, obj):
+        with self.lock:
+            lists = self.sorted.get(obj['type'])
+            if lists is None:
+                return False
+            for field, key in self.extract(obj):
+                entries = lists[field]
+                i = bisect_left(entries, (key, obj['id']))
+                if i < len(entries) and entries[i][1] == obj['id']:
+                    del entries[i]
+            if not lists["id"]:
+                del self.sorted[obj['type']]
+        return True
+
+    def move(self, before, after):
+        with self.lock:
+            lists = self.sorted.get(after['type'])
+            if lists is None:
+                return False
+            old = dict(self.extract(before))
+            for field, key in self.extract(after):
+                if old[field] == key:
+                    continue
+                entries = lists[field]
+                i = bisect_left(entries, (old[field], after['id']))
+                if i < len(entries) and entries[i][1] == after['id']:
+                    del entries[i]
+                insort(entries, (key, after['id']))
+        return True
+
+    # ------------------------------------------------------------------
+    # Query Functions
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def get_fields(stix_type):
+        return TypeIndex._SORT_FIELDS.get(stix_type, TypeIndex._OBSERVABLE_FIELDS)
+
+    def get_types(self, exclude=()):
+        with self.lock:
+            return sorted(t for t in self.sorted if t not in exclude)
+
+    def count(self, types):
+        with self.lock:
+            return sum(len(self.sorted[t]["id"]) for t in types if t in self.sorted)
+
+    def page(self, types, sort="id", descending=False, equals=None, cursor=None, offset=0, limit=100, match=None):
+        after = self.decode_cursor(cursor) if cursor else None
+        if match is None:
+            page = self.read_entries(types, sort, descending, equals, after, offset, offset + limit + 1)
+        else:
+            # Candidates are read in chunks under the lock and matched outside it, so slow filters do not block ingest
+            page, skipped, chunk = [], 0, max(limit + 1, TypeIndex._MATCH_CHUNK)
+            while len(page) <= limit:
+                entries = self.read_entries(types, sort, descending, equals, after, 0, chunk)
+                for entry in entries:
+                    if not match(entry[1]):
+                        continue
+                    if skipped < offset:
+                        skipped += 1
+                        continue
+                    page.append(entry)
+                    if len(page) > limit:
+                        break
+                if len(entries) < chunk:
+                    break
+                after = entries[-1]
+        more = len(page) > limit
+        page = page[:limit]
+        return [obj_id for _, obj_id in page], self.encode_cursor(page[-1]) if more else None
+
+    def read_entries(self, types, sort, descending, equals, after, start, stop):
+        with self.lock:
+            try:
+                return list(islice(self.scan(types, sort, descending, equals, after), start, stop))
+            except TypeError:
+                raise ValueError("Cursor does not match the requested sort order")
+
+    def scan(self, types, sort, descending, equals, after):
+        iterators = []
+        for stix_type in types:
+            lists = self.sorted.get(stix_type)
+            if not lists:
+                continue
+            if sort != "id" and sort not in self.get_fields(stix_type):
+                raise ValueError(f"Cannot sort {stix_type} objects by {sort}")
+            entries = lists[sort]
+            lo, hi = 0, len(entries)
+            if equals is not None:
+                try:
+                    key = self.cast(stix_type, sort, equals)
+                except ValueError:
+                    # A value that cannot be a key of one of several types just matches none of its objects
+                    if len(types) > 1:
+                        continue
+                    raise
+                lo, hi = bisect_left(entries, (key,)), bisect_right(entries, (key, "\uffff"))
+            if after is not None:
+                if descending:
+                    hi = min(hi, bisect_left(entries, after))
+                else:
+                    lo = max(lo, bisect_right(entries, after))
+            if lo < hi:
+                iterators.append(map(entries.__getitem__, range(hi - 1, lo - 1, -1)) if descending else islice(entries, lo, hi))
+        return heapq.merge(*iterators, reverse=descending)
+
+    # ------------------------------------------------------------------
+    # Utils
+    # ------------------------------------------------------------------
+
+    def extract(self, obj):
+        entries = [("id", obj['id'])]
+        for field, cast in self.get_fields(obj['type']).items():
+            try:
+                entries.append((field, self.cast(obj['type'], field, obj.get(field))))
+            except ValueError:
+                entries.append((field, cast()))
+        return entries
+
+    def cast(self, stix_type, field, value):
+        if field == "id":
+            return str(value)
+        cast = self.get_fields(stix_type).get(field, str)
+        if value is None:
+            return cast()
+        try:
+            return cast(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid value for {field}: {value}")
+
+    @staticmethod
+    def encode_cursor(entry):
+        return base64.urlsafe_b64encode(json.dumps(list(entry)).encode("utf-8")).decode("ascii")
+
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            key, obj_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        except (ValueError, TypeError):
+            raise ValueError("Invalid cursor")
+        return (key, obj_id)
@@ -0,0 +1,48 @@
+from pathlib import Path
+
+import unittest
+import sys
+
+SERVER_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(SERVER_DIR))
+
+from src.alert_store import AlertStore
+
+# ------------------------------------------------------------------
+# Status Pages
+# ------------------------------------------------------------------
+
+class TestStatusPages(unittest.TestCase):
+
+    def setUp(self):
+        self.store = AlertStore()
+        for i in range(6):
+            alert = {"id": f"alert-{i}", "agent": "agent", "object": f"object-{i}", "path": ["agent", f"object-{i}"], "timestamp": 1700000000 + i}
+            self.store.add(alert, {"nodes": [], "edges": []})
+
+    def ids(self, status, **kwargs):
+        return [alert['id'] for alert in self.store.list(status, **kwargs)]
+
+    def test_older_alerts_change_status_in_timestamp_order(self):
+        # Newer alerts change status first, so insertion order differs from timestamp order
+        for i in (4, 1, 3, 0):
+            self.store.set_status(f"alert-{i}", "resolved")
+        self.assertEqual(self.ids("resolved"), ["alert-4", "alert-3", "alert-1", "alert-0"])
+        self.assertEqual(self.ids("resolved", newest_first=False), ["alert-0", "alert-1", "alert-3", "alert-4"])
+        self.assertEqual(self.ids("active"), ["alert-5", "alert-2"])
+
+    def test_pages_follow_timestamp_order(self):
+        for i in (5, 2, 4, 0, 3, 1):
+            self.store.set_status(f"alert-{i}", "dismissed")
+        self.assertEqual(self.ids("dismissed", offset=0, limit=2), ["alert-5", "alert-4"])
+        self.assertEqual(self.ids("dismissed", offset=2, limit=2), ["alert-3", "alert-2"])
+        self.assertEqual(self.ids("dismissed", offset=4, limit=2), ["alert-1", "alert-0"])
+        self.assertEqual(self.ids("dismissed", offset=1, limit=3, newest_first=False), ["alert-1", "alert-2", "alert-3"])
+
+    def test_reactivated_alert_keeps_its_place(self):
+        self.store.set_status("alert-1", "resolved")
+        self.store.set_status("alert-1", "active")
+        self.assertEqual(self.ids("active", limit=6), ["alert-5", "alert-4", "alert-3", "alert-2", "alert-1", "alert-0"])
+
+if __name__ == "__main__":
+    unittest.main()
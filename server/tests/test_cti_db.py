@@ -0,0 +1,98 @@
+from pathlib import Path
+
+import unittest
+import logging
+import json
+import sys
+
+SERVER_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(SERVER_DIR))
+
+from src.flow_aggregator import FlowAggregator
+from src.feed_manager import FeedManager
+from src.cti_db import CTIDatabase
+from src.cti_utils import Record, create_ipv4_address_record
+
+START = 1700000100
+
+# ------------------------------------------------------------------
+# Observed Flows
+# ------------------------------------------------------------------
+
+class TestObservedFlows(unittest.TestCase):
+
+    def setUp(self):
+        self.db = CTIDatabase()
+        self.flows = FlowAggregator(self.db, window=300)
+        _, self.src = self.db.create(create_ipv4_address_record("10.0.0.1"), origin="test")
+        _, self.dst = self.db.create(create_ipv4_address_record("10.0.0.2"), origin="test")
+        # The busy flow is reported more often, the quiet one last
+        for i in range(9):
+            _, self.busy = self.flows.observe(self.src, self.dst, 443, "tcp", "test", timestamp=START + i)
+        for i in range(3):
+            _, self.quiet = self.flows.observe(self.src, self.dst, 22, "tcp", "test", timestamp=START + 60 + i)
+
+    def ids(self, **kwargs):
+        return [obj['id'] for obj in self.db.list_objects(["network-traffic"], **kwargs)["objects"]]
+
+    def test_sorts_by_number_observed(self):
+        self.assertEqual(self.ids(sort="number_observed", descending=True), [self.busy, self.quiet])
+        self.assertEqual(self.ids(sort="number_observed"), [self.quiet, self.busy])
+
+    def test_sorts_by_last_seen(self):
+        self.assertEqual(self.ids(sort="last_seen"), [self.busy, self.quiet])
+        self.assertEqual(self.ids(sort="last_seen", descending=True), [self.quiet, self.busy])
+
+    def test_filters_on_observed_fields(self):
+        self.assertEqual(self.ids(filters={"number_observed": "9"}), [self.busy])
+        self.assertEqual(self.ids(filters={"number_observed": "3"}), [self.quiet])
+        self.assertEqual(self.ids(filters={"number_observed": "1"}), [])
+        last_seen = self.db.read(self.quiet)['last_seen']
+        self.assertEqual(self.ids(filters={"last_seen": last_seen}), [self.quiet])
+
+    def test_update_and_delete_drop_observed_keys(self):
+        self.db.update(self.busy, {"dst_port": 8443})
+        self.assertEqual(self.ids(sort="number_observed", descending=True), [self.busy, self.quiet])
+        self.db.delete(self.busy)
+        self.assertEqual(self.ids(sort="number_observed"), [self.quiet])
+        self.assertEqual(self.ids(filters={"number_observed": "9"}), [])
+
+# ------------------------------------------------------------------
+# Export
+# ------------------------------------------------------------------
+
+class TestExport(unittest.TestCase):
+
+    def setUp(self):
+        self.db = CTIDatabase()
+        _, self.address = self.db.create(create_ipv4_address_record("10.0.0.1"), origin="test", risk=70)
+        # Records skip validation on ingest, this one has no valid dst_port
+        self.invalid = "network-traffic--4f506172-83a4-4b5c-9d6e-7f8091a2b3c4"
+        self.db.create(Record(type="network-traffic", id=self.invalid, dst_port="http"), origin="test")
+
+    def test_exports_only_valid_objects(self):
+        self.assertEqual([obj['id'] for obj in self.db.iter_objects()], [self.address])
+        self.assertEqual(len(json.loads("".join(self.db.stream_bundle()))["objects"]), 1)
+        self.assertEqual(self.db.export_bundle()["network_traffic"], [])
+
+    def test_updated_record_is_validated_again(self):
+        list(self.db.iter_objects())
+        self.db.update(self.invalid, {"dst_ref": self.address, "dst_port": 80, "protocols": ["tcp"]})
+        self.assertEqual(sorted(obj['id'] for obj in self.db.iter_objects()), sorted([self.address, self.invalid]))
+
+    def test_metadata_stays_under_extension(self):
+        obj = next(self.db.iter_objects())
+        self.assertFalse({"risk", "tlp", "history", "origin", "updated"} & set(obj))
+        self.assertEqual(obj['x_icarus']['risk'], 70)
+        self.assertEqual(obj['x_icarus']['origin'], "test")
+
+    def test_export_feeds_another_server(self):
+        db = CTIDatabase()
+        feeds = FeedManager(db, logging.getLogger("test"))
+        self.addCleanup(feeds.session.close)
+        feeds.ingest_batch(list(self.db.iter_objects()), "peer")
+        self.assertEqual(db.read(self.address)['risk'], 70)
+        self.assertNotIn("x_icarus", db.read(self.address))
+
+if __name__ == "__main__":
+    unittest.main()
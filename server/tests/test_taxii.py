@@ -0,0 +1,135 @@
+from importlib.util import spec_from_file_location, module_from_spec
+from werkzeug.serving import make_server
+from pathlib import Path
+
+import threading
+import unittest
+import logging
+import sys
+
+SERVER_DIR = Path(__file__).resolve().parents[1]
+PUBLISHER_FILE = SERVER_DIR.parent / "proof-of-concept" / "cti-publisher" / "src" / "publisher.py"
+sys.path.insert(0, str(SERVER_DIR))
+
+from src.taxii_client import TAXIIClient
+from src.feed_manager import FeedManager
+from src.cti_db import CTIDatabase
+from src.cti_utils import create_ipv4_address_record
+
+# ------------------------------------------------------------------
+# CTI Publisher Stand-in
+# Note: The publisher lives in its own "src" package, so it is loaded
+# from its file under another name and served on a free local port.
+# ------------------------------------------------------------------
+
+def load_publisher():
+    spec = spec_from_file_location("cti_publisher", PUBLISHER_FILE)
+    module = module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.Publisher
+
+ADDRESS_ID = "ipv4-addr--0b1c2d3e-4f50-4a61-8b72-93a4b5c6d7e8"
+ACTOR_ID = "threat-actor--1c2d3e4f-5061-4b72-8c83-a4b5c6d7e8f9"
+DOMAIN_ID = "domain-name--2d3e4f50-6172-4c83-9d94-b5c6d7e8f9a0"
+
+BUNDLES = [
+    {"objects": [{"type": "ipv4-addr", "id": ADDRESS_ID, "value": "198.51.100.7", "risk": 80}]},
+    {"objects": [{"type": "threat-actor", "id": ACTOR_ID, "name": "Actor", "risk": 60}]},
+    {"relationships": [{"type": "relationship", "id": "relationship--3e4f5061-7283-4d94-8ea5-c6d7e8f9a0b1", "relationship_type": "related-to", "source_ref": ADDRESS_ID, "target_ref": ACTOR_ID}]}
+]
+LATER_BUNDLE = {"objects": [{"type": "domain-name", "id": DOMAIN_ID, "value": "example.test", "risk": 30}]}
+ADDED = [1700000060, 1700000120, 1700000180]
+
+class PublisherTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.publisher = load_publisher()(host="127.0.0.1", port=0)
+        cls.server = make_server("127.0.0.1", 0, cls.publisher.app)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.thread.join()
+
+    def setUp(self):
+        self.publisher.available_data = {"0": list(BUNDLES)}
+        self.publisher.date_added = {"0": list(ADDED)}
+        self.collection_url = f"{self.base_url}/api/collections/{self.publisher.taxii_id('0')}/"
+
+    def publish(self, bundle, added):
+        self.publisher.available_data["0"].append(bundle)
+        self.publisher.date_added["0"].append(added)
+
+# ------------------------------------------------------------------
+# TAXII Client
+# ------------------------------------------------------------------
+
+class TestTAXIIClient(PublisherTestCase):
+
+    def test_discovers_readable_collections(self):
+        client = TAXIIClient(f"{self.base_url}/taxii2/")
+        self.assertEqual(client.get_api_roots(), [f"{self.base_url}/api/"])
+        self.assertEqual(client.get_collection_urls(), [self.collection_url])
+
+    def test_collection_url_skips_discovery(self):
+        client = TAXIIClient(self.collection_url)
+        self.assertEqual(client.get_collection_urls(), [self.collection_url])
+
+    def test_follows_more_and_next(self):
+        client = TAXIIClient(self.collection_url)
+        pages = list(client.iter_objects(self.collection_url, limit=2))
+        self.assertEqual([len(objects) for objects, _ in pages], [2, 1])
+        self.assertEqual([obj['id'] for objects, _ in pages for obj in objects], [ADDRESS_ID, ACTOR_ID, "relationship--3e4f5061-7283-4d94-8ea5-c6d7e8f9a0b1"])
+        self.assertEqual([last for _, last in pages], [self.publisher.format_timestamp(ADDED[1]), self.publisher.format_timestamp(ADDED[2])])
+
+    def test_added_after_returns_later_objects(self):
+        client = TAXIIClient(self.collection_url)
+        pages = list(client.iter_objects(self.collection_url, added_after=self.publisher.format_timestamp(ADDED[0])))
+        self.assertEqual([obj['id'] for objects, _ in pages for obj in objects], [ACTOR_ID, "relationship--3e4f5061-7283-4d94-8ea5-c6d7e8f9a0b1"])
+
+    def test_rejects_non_taxii_responses(self):
+        client = TAXIIClient(self.base_url)
+        with self.assertRaises(ValueError):
+            client.get(f"{self.base_url}/collections/0")
+
+# ------------------------------------------------------------------
+# Feed Manager
+# ------------------------------------------------------------------
+
+class TestReadTAXIIFeed(PublisherTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.db = CTIDatabase()
+        self.feeds = FeedManager(self.db, logging.getLogger("test"), page_size=1)
+        self.feeds.create("taxii", f"{self.base_url}/taxii2/", feed_type="taxii")
+
+    def tearDown(self):
+        self.feeds.session.close()
+
+    def test_reads_every_page_and_saves_cursor(self):
+        self.assertEqual(self.feeds.read_taxii_feed("taxii"), 3)
+        self.assertEqual(self.feeds.state["taxii"]["cursors"], {self.collection_url: self.publisher.format_timestamp(ADDED[2])})
+        self.assertEqual(self.db.read(ACTOR_ID)['risk'], 60)
+
+    def test_resolves_references_across_pages(self):
+        # The address already exists under the server's own id, so the feed id has to be remapped
+        _, local_id = self.db.create(create_ipv4_address_record("198.51.100.7"), origin="test")
+        self.assertNotEqual(local_id, ADDRESS_ID)
+        self.feeds.read_taxii_feed("taxii")
+        self.assertEqual([target for _, target in self.db.get_successors(local_id)], [ACTOR_ID])
+        self.assertEqual(self.db.get_successors(ADDRESS_ID), [])
+
+    def test_cursor_only_fetches_new_objects(self):
+        self.feeds.read_taxii_feed("taxii")
+        self.publish(LATER_BUNDLE, ADDED[-1] + 60)
+        self.assertEqual(self.feeds.read_taxii_feed("taxii"), 1)
+        self.assertEqual(self.db.read(DOMAIN_ID)['value'], "example.test")
+        self.assertEqual(self.feeds.state["taxii"]["cursors"][self.collection_url], self.publisher.format_timestamp(ADDED[-1] + 60))
+
+if __name__ == "__main__":
+    unittest.main()